@@ -1,13 +1,19 @@
-from argon2 import PasswordHasher
-from argon2.exceptions import VerifyMismatchError
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from fastapi import HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
 from app import models
-from app.database import get_db
+from app.database import get_async_db, get_db
+from app import passwords
+from app.utils.cache import TTLCache
+from app.utils.invalidation import notify, register_handler, register_reset
+from app.utils.user_stats import get_user_stats
+import hashlib
 import os
+import time
 
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecret")
 REFRESH_SECRET_KEY = os.getenv("REFRESH_SECRET_KEY", "refresh_secret")
@@ -15,19 +21,54 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1500  # Уменьшаем время жизни access токена
 REFRESH_TOKEN_EXPIRE_DAYS = 3000
 
-ph = PasswordHasher()
+# Кэш записей пользователей для get_current_user, ключ - login
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+# Кэш уже проверенных токенов: повторный токен не декодируется заново
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "300"))
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+
+# Записи пользователей сбрасываются во всех воркерах (app/utils/invalidation.py).
+# token_cache хранит только проверенные подписью claims - от записей в БД
+# они не зависят и в инвалидации не нуждаются
+register_handler("user")(user_cache.invalidate)
+register_reset(user_cache.clear)
 
 
 def verify_password(plain_password, hashed_password):
-    try:
-        return ph.verify(hashed_password, plain_password)
-    except VerifyMismatchError:
-        return False
+    return passwords.verify_password(plain_password, hashed_password)
 
 
 def get_password_hash(password):
-    return ph.hash(password)
+    return passwords.hash_password(password)
+
+
+def decode_token(token: str, secret: str) -> dict:
+    """
+    jwt.decode с LRU-кэшем проверенных claims по хэшу токена и ключа.
+    Запись живёт не дольше exp токена; ошибки проверки не кэшируются
+    и, как и раньше, выбрасывают JWTError.
+    """
+    key = hashlib.sha256(f"{secret}.{token}".encode()).digest()
+
+    cached = token_cache.get(key)
+    if cached is not None:
+        return dict(cached)
+
+    payload = jwt.decode(token, secret, algorithms=[ALGORITHM])
+
+    ttl = TOKEN_CACHE_TTL
+    if "exp" in payload:
+        ttl = min(ttl, float(payload["exp"]) - time.time())
+    if ttl > 0:
+        token_cache.set(key, dict(payload), ttl=ttl)
+
+    return payload
 
 
 def create_access_token(data: dict):
@@ -44,7 +85,7 @@ def create_refresh_token(data: dict):
 
 def verify_refresh_token(token: str):
     try:
-        payload = jwt.decode(token, REFRESH_SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token, REFRESH_SECRET_KEY)
         if payload.get("type") != "refresh":
             raise JWTError("Invalid token type")
         return payload
@@ -52,30 +93,87 @@ def verify_refresh_token(token: str):
         return None
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def _token_login(token: str) -> str:
+    """login из access-токена или 401"""
     credentials_exception = HTTPException(status_code=401, detail="Could not validate credentials")
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token, SECRET_KEY)
         if payload.get("type") != "access":
             raise credentials_exception
 
         login: str = payload.get("sub")
-        is_admin: bool = payload.get("is_admin", False)
-        application_submitted: bool = payload.get("application_submitted", False)
-        has_pending_application: bool = payload.get("has_pending_application", False)
 
         if login is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
 
+    return login
+
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    login = _token_login(token)
+
+    cached = user_cache.get(login)
+    if cached is not None:
+        return _attach_cached_user(db, cached)
+
     user = db.query(models.User).filter(models.User.login == login).first()
     if user is None:
-        raise credentials_exception
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+
+    user_cache.set(login, _user_snapshot(user))
     return user
 
 
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """get_current_user для эндпоинтов на асинхронной сессии"""
+    login = _token_login(token)
+
+    cached = user_cache.get(login)
+    if cached is not None:
+        user = models.User(**cached)
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+
+    user = await db.scalar(select(models.User).where(models.User.login == login))
+    if user is None:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+
+    user_cache.set(login, _user_snapshot(user))
+    return user
+
+
+def _user_snapshot(user: models.User) -> dict:
+    """Значения колонок пользователя для кэша (без ORM-состояния)"""
+    return {attr.key: getattr(user, attr.key) for attr in inspect(models.User).column_attrs}
+
+
+def _attach_cached_user(db: Session, snapshot: dict) -> models.User:
+    """
+    Пользователь из кэша, привязанный к сессии запроса без SELECT:
+    изменения полей сохраняются обычным db.commit().
+    """
+    user = models.User(**snapshot)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+
+def invalidate_user(db: Session, login: str):
+    """
+    Сбросить кэш пользователя во всех воркерах при commit изменения
+    его записи. Вызывать до db.commit()
+    """
+    notify(db, "user", login)
+
+
+def has_pending_application(db: Session, user_id: int) -> bool:
+    """Есть ли у пользователя заявка в ожидании или отклонённая"""
+    stats = get_user_stats(db, user_id)
+    return stats.pending_applications + stats.rejected_applications > 0
+
+
 def create_token_data(user: models.User, db: Session):
     """Создает данные для токена"""
     token_data = {
@@ -86,11 +184,6 @@ def create_token_data(user: models.User, db: Session):
     if not user.is_admin:
         token_data["application_submitted"] = user.application_submitted
 
-        has_pending = db.query(models.Application).filter(
-            models.Application.user_id == user.id,
-            models.Application.status.in_(["pending", "rejected"])
-        ).first() is not None
-
-        token_data["has_pending_application"] = has_pending
+        token_data["has_pending_application"] = has_pending_application(db, user.id)
 
     return token_data
\ No newline at end of file
@@ -1,7 +1,13 @@
 import os
+from fastapi import Request
 from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from app.models import Base
+from app.utils.db_pool import pool_options
+from app.utils.read_routing import mark_replica_down, use_primary
+from app.utils.sqlite import WriterLock, configure_engine as configure_sqlite, is_sqlite_file
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,9 +17,70 @@ if not DATABASE_URL:
     raise ValueError("DATABASE_URL не задана в окружении или в .env файле")
 
 # Для разработки можно включить echo=True
-engine = create_engine(DATABASE_URL, echo=False)
+# Размер пула, таймауты и pre-ping задаются через DB_POOL_* (app/utils/db_pool.py)
+engine = create_engine(DATABASE_URL, echo=False, **pool_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Встраиваемый режим на SQLite: WAL, pragmas и очередь писателей (app/utils/sqlite.py)
+SQLITE_MODE = is_sqlite_file(DATABASE_URL)
+sqlite_writer_lock = WriterLock() if SQLITE_MODE else None
+if SQLITE_MODE:
+    configure_sqlite(engine, sqlite_writer_lock)
+
+# Асинхронные драйверы для тех же баз
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """postgresql://... -> postgresql+asyncpg://..., sqlite:///... -> sqlite+aiosqlite:///..."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"Нет асинхронного драйвера для {backend}, задайте ASYNC_DATABASE_URL")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+# Асинхронный стек для эндпоинтов с большим числом одновременных
+# запросов (данные от Arduino, опрос устройств, последние значения):
+# они не занимают потоки пула Starlette, пока ждут БД.
+# expire_on_commit=False - после commit атрибуты не перечитываются неявно
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, echo=False, **pool_options(ASYNC_DATABASE_URL, is_async=True)
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+if is_sqlite_file(ASYNC_DATABASE_URL):
+    configure_sqlite(async_engine.sync_engine)
+
+# Реплика для чтения; без DATABASE_READ_URL чтение идёт в основную БД
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+if DATABASE_READ_URL:
+    read_engine = create_engine(DATABASE_READ_URL, echo=False, **pool_options(DATABASE_READ_URL, read_only=True))
+    ASYNC_DATABASE_READ_URL = os.getenv("ASYNC_DATABASE_READ_URL") or async_database_url(DATABASE_READ_URL)
+    async_read_engine = create_async_engine(
+        ASYNC_DATABASE_READ_URL, echo=False, **pool_options(ASYNC_DATABASE_READ_URL, is_async=True, read_only=True)
+    )
+    for read_url, configured in ((DATABASE_READ_URL, read_engine), (ASYNC_DATABASE_READ_URL, async_read_engine.sync_engine)):
+        if is_sqlite_file(read_url):
+            configure_sqlite(configured)
+elif is_sqlite_file(ASYNC_DATABASE_URL):
+    # Асинхронный движок SQLite пишет через одно соединение, поэтому
+    # чтение идёт через отдельный пул к тому же файлу (WAL не блокирует читателей)
+    read_engine = engine
+    async_read_engine = create_async_engine(
+        ASYNC_DATABASE_URL, echo=False, **pool_options(ASYNC_DATABASE_URL, is_async=True, read_only=True)
+    )
+    configure_sqlite(async_read_engine.sync_engine)
+else:
+    read_engine = engine
+    async_read_engine = async_engine
+
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -21,5 +88,47 @@ def get_db():
     finally:
         db.close()
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_read_db(request: Request):
+    """
+    Сессия для эндпоинтов, которые только читают: реплика, если она
+    настроена и клиенту не нужна основная БД (app/utils/read_routing.py).
+    Если к реплике не удаётся подключиться - основная БД.
+    """
+    if read_engine is engine or use_primary(request):
+        yield from get_db()
+        return
+
+    db = ReadSessionLocal()
+    try:
+        try:
+            db.connection()
+        except DBAPIError:
+            db.close()
+            mark_replica_down()
+            db = SessionLocal()
+        yield db
+    finally:
+        db.close()
+
+async def get_read_async_db(request: Request):
+    """get_read_db для асинхронной сессии"""
+    if async_read_engine is async_engine or use_primary(request):
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+
+    db = AsyncReadSessionLocal()
+    try:
+        try:
+            await db.connection()
+        except DBAPIError:
+            await db.close()
+            mark_replica_down()
+            db = AsyncSessionLocal()
+        yield db
+    finally:
+        await db.close()
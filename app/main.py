@@ -1,10 +1,64 @@
-from fastapi import FastAPI
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database import init_db
-from app.routers import rooms, applications, auth, sensors, users, arduino_endpoint, home_control, outdoor_temperature, outdoor_light
+from app.database import SessionLocal, async_engine, async_read_engine, engine, read_engine
+from app.migrations import ensure_schema
+from app.passwords import shutdown_pool as shutdown_password_pool
+from app.utils.approval_jobs import (
+    resume_jobs as resume_approval_jobs,
+    shutdown_workers as shutdown_approval_workers,
+    start_sweeper as start_approval_sweeper,
+    stop_sweeper as stop_approval_sweeper,
+)
+from app.utils.invalidation import start_listener as start_invalidation_listener, stop_listener as stop_invalidation_listener
+from app.utils.live_state import live_state
+from app.utils.metrics import request_metrics
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.query_stats import QUERY_COUNT_HEADER, QueryStats, current_query_stats, install_query_hooks
+from app.utils.read_routing import READ_METHODS, remember_write
+from app.utils.startup import readiness, wait_for_database
+from app.routers import rooms, applications, auth, sensors, users, arduino_endpoint, home_control, outdoor_temperature, outdoor_light, dashboard, internal
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    readiness.starting()
+    # Ждём БД с backoff; таблицы и миграции - только если версия схемы
+    # устарела (обычно их уже применил scripts/init_db.py в startup.sh)
+    wait_for_database(engine)
+    ensure_schema(engine)
+    # Слушаем инвалидации других воркеров до прогрева, чтобы не пропустить
+    # изменения, сделанные во время загрузки
+    await start_invalidation_listener(engine)
+    # Прогреваем текущие значения датчиков в памяти
+    with SessionLocal() as db:
+        live_state.warm(db)
+    # Дообрабатываем пакетные одобрения, прерванные перезапуском
+    resume_approval_jobs()
+    start_approval_sweeper()
+    readiness.mark_ready()
+    logger.info("Startup finished in %.2fs", readiness.startup_seconds)
+    yield
+    readiness.mark_stopping()
+    await stop_invalidation_listener()
+    await stop_approval_sweeper()
+    shutdown_approval_workers()
+    shutdown_password_pool()
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
+
+
+for instrumented in {engine, read_engine, async_engine.sync_engine, async_read_engine.sync_engine}:
+    install_query_hooks(instrumented)
 
 app = FastAPI(
+    lifespan=lifespan,
     title="Smart Home API",
     description="API для управления умным домом",
     version="1.0.0",
@@ -19,9 +73,51 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Браузер отдаёт скрипту только перечисленные заголовки ответа
+    expose_headers=[NEXT_CURSOR_HEADER, "X-Query-Count"],
 )
 
-init_db()
+
+@app.middleware("http")
+async def remember_writes(request: Request, call_next):
+    # Следующие чтения этого клиента пойдут в основную БД (read-your-writes)
+    response = await call_next(request)
+    if request.method not in READ_METHODS and response.status_code < 400:
+        remember_write(request, response)
+    return response
+
+@app.middleware("http")
+async def collect_metrics(request: Request, call_next):
+    # Длительность и SQL-запросы по маршрутам для /metrics
+    query_stats = QueryStats()
+    token = current_query_stats.set(query_stats)
+    request_metrics.started()
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        if QUERY_COUNT_HEADER:
+            response.headers["X-Query-Count"] = str(query_stats.count)
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_path = route.path if route else "unmatched"
+
+        repeated = query_stats.repeated()
+        for shape, count in repeated:
+            logger.warning("Possible N+1 in %s %s: %d x %s", request.method, route_path, count, shape)
+
+        request_metrics.finished(
+            request.method,
+            route_path,
+            status_code,
+            time.perf_counter() - start,
+            query_stats.count,
+            query_stats.seconds,
+            repeated=bool(repeated)
+        )
+        current_query_stats.reset(token)
 
 app.include_router(sensors.router)
 app.include_router(auth.router)
@@ -32,6 +128,10 @@ app.include_router(arduino_endpoint.router)
 app.include_router(home_control.router)
 app.include_router(outdoor_temperature.router)
 app.include_router(outdoor_light.router)
+app.include_router(dashboard.router)
+app.include_router(internal.router)
+app.include_router(internal.metrics_router)
+app.include_router(internal.health_router)
 @app.get("/")
 def root():
     return {"message": "Smart Home API is running 🚀"}
@@ -0,0 +1,224 @@
+"""
+Миграции данных, которые не покрывает Base.metadata.create_all.
+
+Каждая миграция идемпотентна: её можно запускать повторно, уже
+применённые шаги ничего не делают. Чтобы не сверять все таблицы при
+каждом старте, номер применённой схемы хранится в таблице
+schema_version: ensure_schema запускает create_all и миграции, только
+если он меньше SCHEMA_VERSION.
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+
+from app.models import Base, SchemaVersion
+
+# Увеличивать при каждом изменении моделей или новой миграции
+SCHEMA_VERSION = 3
+
+# Ключ pg_advisory_lock: миграции не запускаются параллельно
+# несколькими экземплярами приложения
+MIGRATION_LOCK_KEY = 7340421
+
+# Таблицы датчиков до перехода на единую таблицу sensors:
+# имя таблицы -> (тип датчика, выражения для колонок value, is_on, status)
+LEGACY_SENSOR_TABLES = {
+    "temperature_sensors": ("temperature", "value", "NULL", "NULL"),
+    "light_sensors": ("light", "NULL", "is_on", "NULL"),
+    "gas_sensors": ("gas", "NULL", "value", "status"),
+    "humidity_sensors": ("humidity", "humidity_level", "NULL", "NULL"),
+    "ventilation_sensors": ("ventilation", "NULL", "is_on", "NULL"),
+}
+
+
+def migrate_unified_sensors(engine: Engine) -> dict:
+    """
+    Переносит датчики из пяти старых таблиц в таблицу sensors и удаляет
+    старые таблицы. Возвращает соответствие {(тип, старый id): новый id}:
+    идентификаторы датчиков теперь глобальные, прошивки Arduino нужно
+    перенастроить на новые sensor_db_id.
+    """
+    existing = set(inspect(engine).get_table_names())
+    mapping = {}
+
+    with engine.begin() as conn:
+        for table, (kind, value, is_on, status) in LEGACY_SENSOR_TABLES.items():
+            if table not in existing:
+                continue
+
+            rows = conn.execute(text(
+                f"SELECT id, room_id, {value} AS value, {is_on} AS is_on, "
+                f"{status} AS status, created_at FROM {table} ORDER BY id"
+            )).mappings().all()
+
+            for row in rows:
+                new_id = conn.execute(
+                    text(
+                        "INSERT INTO sensors (room_id, type, value, is_on, status, created_at) "
+                        "VALUES (:room_id, :type, :value, :is_on, :status, :created_at) "
+                        "RETURNING id"
+                    ),
+                    {
+                        "room_id": row["room_id"],
+                        "type": kind,
+                        "value": row["value"],
+                        "is_on": None if row["is_on"] is None else bool(row["is_on"]),
+                        "status": row["status"],
+                        "created_at": row["created_at"],
+                    }
+                ).scalar_one()
+                mapping[(kind, row["id"])] = new_id
+
+            conn.execute(text(f"DROP TABLE {table}"))
+
+    return mapping
+
+
+# Количество комнат и датчиков пользователя по таблицам rooms и sensors
+USER_ROOMS_COUNT_SQL = "(SELECT COUNT(*) FROM rooms r WHERE r.user_id = {user_id})"
+USER_SENSORS_COUNT_SQL = (
+    "(SELECT COUNT(*) FROM sensors se JOIN rooms r ON r.id = se.room_id "
+    "WHERE r.user_id = {user_id})"
+)
+
+
+def add_user_stats_totals(engine: Engine) -> bool:
+    """Добавляет в user_stats колонки total_rooms и total_sensors и заполняет их"""
+    columns = {column["name"] for column in inspect(engine).get_columns("user_stats")}
+    if "total_rooms" in columns:
+        return False
+
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE user_stats ADD COLUMN total_rooms INTEGER NOT NULL DEFAULT 0"))
+        conn.execute(text("ALTER TABLE user_stats ADD COLUMN total_sensors INTEGER NOT NULL DEFAULT 0"))
+        conn.execute(text(
+            "UPDATE user_stats SET "
+            f"total_rooms = {USER_ROOMS_COUNT_SQL.format(user_id='user_stats.user_id')}, "
+            f"total_sensors = {USER_SENSORS_COUNT_SQL.format(user_id='user_stats.user_id')}"
+        ))
+    return True
+
+
+def backfill_user_stats(engine: Engine) -> int:
+    """Создаёт строки user_stats для пользователей, у которых их ещё нет"""
+    with engine.begin() as conn:
+        result = conn.execute(text(
+            "INSERT INTO user_stats "
+            "(user_id, pending_applications, approved_applications, rejected_applications, "
+            "total_rooms, total_sensors) "
+            "SELECT u.id, "
+            "COALESCE(SUM(CASE WHEN a.status = 'pending' THEN 1 ELSE 0 END), 0), "
+            "COALESCE(SUM(CASE WHEN a.status = 'approved' THEN 1 ELSE 0 END), 0), "
+            "COALESCE(SUM(CASE WHEN a.status = 'rejected' THEN 1 ELSE 0 END), 0), "
+            f"{USER_ROOMS_COUNT_SQL.format(user_id='u.id')}, "
+            f"{USER_SENSORS_COUNT_SQL.format(user_id='u.id')} "
+            "FROM users u LEFT JOIN applications a ON a.user_id = u.id "
+            "WHERE NOT EXISTS (SELECT 1 FROM user_stats s WHERE s.user_id = u.id) "
+            "GROUP BY u.id"
+        ))
+        return result.rowcount
+
+
+# Таблицы с постраничной выдачей по (created_at, id)
+PAGINATED_TABLES = ("users", "applications")
+
+
+def make_created_at_not_null(engine: Engine) -> int:
+    """
+    Заполняет пустые created_at и запрещает NULL: строки без даты не
+    попадают в сравнение по ключу страницы и ломают курсор. Дата
+    неизвестна, поэтому ставится начало эпохи - такие строки идут
+    последними. Возвращает число заполненных строк.
+    """
+    filled = 0
+    with engine.begin() as conn:
+        for table in PAGINATED_TABLES:
+            filled += conn.execute(text(
+                f"UPDATE {table} SET created_at = :epoch WHERE created_at IS NULL"
+            ), {"epoch": datetime(1970, 1, 1)}).rowcount
+            # В SQLite нельзя изменить колонку: NOT NULL задают новые
+            # таблицы из моделей, в старых остаётся только заполнение
+            if engine.dialect.name == "postgresql":
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL"))
+    return filled
+
+
+def create_missing_indexes(engine: Engine):
+    """create_all не добавляет новые индексы к уже существующим таблицам"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def run_migrations(engine: Engine):
+    create_missing_indexes(engine)
+
+    mapping = migrate_unified_sensors(engine)
+    if mapping:
+        print(f"Migrated {len(mapping)} sensors into the unified sensors table:")
+        for (kind, old_id), new_id in sorted(mapping.items()):
+            print(f"  {kind} #{old_id} -> sensor_db_id {new_id}")
+
+    if add_user_stats_totals(engine):
+        print("Added room and sensor totals to user_stats")
+
+    backfilled = backfill_user_stats(engine)
+    if backfilled:
+        print(f"Created user_stats rows for {backfilled} users")
+
+    filled = make_created_at_not_null(engine)
+    if filled:
+        print(f"Filled created_at for {filled} users and applications")
+
+
+def get_schema_version(engine: Engine) -> Optional[int]:
+    """Номер применённой схемы или None, если база ещё пустая"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(SchemaVersion.version).where(SchemaVersion.id == 1)).scalar()
+    except DBAPIError:
+        # Таблицы schema_version ещё нет
+        return None
+
+
+def set_schema_version(engine: Engine, version: int = SCHEMA_VERSION):
+    with engine.begin() as conn:
+        updated = conn.execute(
+            SchemaVersion.__table__.update().where(SchemaVersion.id == 1).values(version=version)
+        ).rowcount
+        if not updated:
+            conn.execute(SchemaVersion.__table__.insert().values(id=1, version=version))
+
+
+def ensure_schema(engine: Engine) -> bool:
+    """
+    Создаёт таблицы и применяет миграции, если сохранённая версия схемы
+    устарела. Возвращает True, если схема обновлялась.
+    """
+    version = get_schema_version(engine)
+    if version is not None and version >= SCHEMA_VERSION:
+        return False
+
+    lock = None
+    if engine.dialect.name == "postgresql":
+        lock = engine.connect()
+        lock.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+    try:
+        # Пока ждали блокировку, схему мог обновить другой экземпляр
+        version = get_schema_version(engine)
+        if version is not None and version >= SCHEMA_VERSION:
+            return False
+
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
+        set_schema_version(engine)
+        print(f"Schema upgraded: {version} -> {SCHEMA_VERSION}")
+        return True
+    finally:
+        if lock is not None:
+            lock.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            lock.close()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, DateTime, JSON, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, DateTime, JSON, UniqueConstraint, Index
 from sqlalchemy.ext.mutable import MutableList
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
@@ -27,6 +27,17 @@ SENSOR_TYPES = {
     6: "Датчик движения"
 }
 
+# Тип датчика из справочника -> тип в таблице sensors
+SENSOR_KINDS = {
+    1: "temperature",
+    2: "light",
+    3: "gas",
+    4: "humidity",
+    5: "ventilation",
+}
+
+SENSOR_KIND_IDS = {kind: type_id for type_id, kind in SENSOR_KINDS.items()}
+
 SENSOR_NAMES = {
     'temperature': 'Датчик температуры',
     'light': 'Датчик освещения',
@@ -38,6 +49,10 @@ SENSOR_NAMES = {
 # ---------- Пользователь ----------
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Постраничный список пользователей для админа
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     login = Column(String, unique=True, nullable=False)
@@ -48,13 +63,45 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
     application_submitted = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # NOT NULL: ключ постраничной выдачи (app/utils/pagination.py)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     applications = relationship("Application", back_populates="user")
 
+# ---------- Версия схемы ----------
+# Одна строка: номер последней применённой схемы (app/migrations.py).
+# По нему старт приложения решает, нужны ли create_all и миграции
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# ---------- Статистика пользователя ----------
+# Денормализованные счётчики заявок по статусам, меняются в той же
+# транзакции, что и сами заявки (app/utils/user_stats.py)
+class UserStats(Base):
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    pending_applications = Column(Integer, default=0, nullable=False)
+    approved_applications = Column(Integer, default=0, nullable=False)
+    rejected_applications = Column(Integer, default=0, nullable=False)
+    # Комнаты и датчики, созданные по одобренным заявкам
+    total_rooms = Column(Integer, default=0, nullable=False)
+    total_sensors = Column(Integer, default=0, nullable=False)
+
 # ---------- Заявка ----------
 class Application(Base):
     __tablename__ = "applications"
+    __table_args__ = (
+        # Постраничные админские списки: все заявки и фильтр по статусу
+        Index("ix_applications_created_at_id", "created_at", "id"),
+        Index("ix_applications_status_created_at", "status", "created_at", "id"),
+        # Заявки пользователя (/applications/my, пересчёт статистики)
+        Index("ix_applications_user_id_created_at", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -62,112 +109,101 @@ class Application(Base):
     created_room_ids = Column(JSON, nullable=True)
     status = Column(String, default="pending")
     rejection_comment = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # NOT NULL: ключ постраничной выдачи (app/utils/pagination.py)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user = relationship("User", back_populates="applications")
 
 
-# ---------- Комнаты ----------
-class Room(Base):
-    __tablename__ = "rooms"
+# ---------- Пакетное одобрение заявок ----------
+# Задание хранится в БД, поэтому переживает перезапуск сервера:
+# незавершённые позиции дообрабатываются при старте (app/utils/approval_jobs.py)
+class ApprovalJob(Base):
+    __tablename__ = "approval_jobs"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-
-    name = Column(String, nullable=False)
-    room_type = Column(String, nullable=False)
-
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    status = Column(String, default="queued", nullable=False)  # queued, running, done
+    total = Column(Integer, default=0, nullable=False)
+    succeeded = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
 
-    user = relationship("User")
-
-    temperature_sensors = relationship(
-        "TemperatureSensor",
-        back_populates="room",
-        cascade="all, delete-orphan"
-    )
-    light_sensors = relationship(
-        "LightSensor",
-        back_populates="room",
-        cascade="all, delete-orphan"
-    )
-    gas_sensors = relationship(
-        "GasSensor",
-        back_populates="room",
-        cascade="all, delete-orphan"
-    )
-    humidity_sensors = relationship(
-        "HumiditySensor",
-        back_populates="room",
-        cascade="all, delete-orphan"
+    items = relationship(
+        "ApprovalJobItem",
+        back_populates="job",
+        cascade="all, delete-orphan",
+        order_by="ApprovalJobItem.id"
     )
-    ventilation_sensors = relationship(
-        "VentilationSensor",
-        back_populates="room",
-        cascade="all, delete-orphan"
-    )
-
-# ---------- Датчики ----------
-class TemperatureSensor(Base):
-    __tablename__ = "temperature_sensors"
 
-    id = Column(Integer, primary_key=True, index=True)
-    room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
 
-    value = Column(Float, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-
-    room = relationship("Room", back_populates="temperature_sensors")
-
-
-class LightSensor(Base):
-    __tablename__ = "light_sensors"
+class ApprovalJobItem(Base):
+    __tablename__ = "approval_job_items"
+    __table_args__ = (
+        # Выбор следующей необработанной позиции задания
+        Index("ix_approval_job_items_job_id_status", "job_id", "status"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
-
-    is_on = Column(Boolean, default=False, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    job_id = Column(Integer, ForeignKey("approval_jobs.id"), nullable=False)
+    application_id = Column(Integer, nullable=False)
+    status = Column(String, default="pending", nullable=False)  # pending, running, done, failed
+    error = Column(String, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
 
-    room = relationship("Room", back_populates="light_sensors")
+    job = relationship("ApprovalJob", back_populates="items")
 
 
-class GasSensor(Base):
-    __tablename__ = "gas_sensors"
+# ---------- Комнаты ----------
+class Room(Base):
+    __tablename__ = "rooms"
+    __table_args__ = (
+        # Все запросы к комнатам ограничены пользователем (app/utils/tenant.py)
+        Index("ix_rooms_user_id_id", "user_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
-
-    value = Column(Boolean, nullable=True)
-    status = Column(String, default="данных нет")
-    created_at = Column(DateTime, default=datetime.utcnow)
-
-    room = relationship("Room", back_populates="gas_sensors")
-
-
-class HumiditySensor(Base):
-    __tablename__ = "humidity_sensors"
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
-    id = Column(Integer, primary_key=True, index=True)
-    room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
+    name = Column(String, nullable=False)
+    room_type = Column(String, nullable=False)
 
-    humidity_level = Column(Float, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    room = relationship("Room", back_populates="humidity_sensors")
+    user = relationship("User")
 
+    sensors = relationship(
+        "Sensor",
+        back_populates="room",
+        cascade="all, delete-orphan",
+        order_by="Sensor.id"
+    )
 
-class VentilationSensor(Base):
-    __tablename__ = "ventilation_sensors"
+# ---------- Датчики ----------
+# Все датчики хранятся в одной таблице, тип определяет используемые колонки:
+#   temperature, humidity -> value (float)
+#   light, ventilation    -> is_on (bool)
+#   gas                   -> is_on (bool, None = данных нет) + status
+class Sensor(Base):
+    __tablename__ = "sensors"
+    __table_args__ = (
+        # Датчики комнаты; покрывает и поиск только по room_id
+        Index("ix_sensors_room_id_type", "room_id", "type"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
+    type = Column(String, nullable=False)
 
-    is_on = Column(Boolean, default=False, nullable=False)
+    value = Column(Float, nullable=True)
+    is_on = Column(Boolean, nullable=True)
+    status = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    room = relationship("Room", back_populates="ventilation_sensors")
+    room = relationship("Room", back_populates="sensors")
 
 # Управление через приложение
 class HomeControlMode(Base):
@@ -188,6 +224,10 @@ class HomeControlMode(Base):
 # Температура снаружи
 class OutdoorTemperature(Base):
     __tablename__ = "outdoor_temperatures"
+    __table_args__ = (
+        # Последнее значение пользователя
+        Index("ix_outdoor_temperatures_user_id_created_at", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -205,6 +245,10 @@ class OutdoorTemperature(Base):
 
 class OutdoorLight(Base):
     __tablename__ = "outdoor_light"
+    __table_args__ = (
+        # Последнее значение пользователя
+        Index("ix_outdoor_light_user_id_created_at", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
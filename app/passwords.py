@@ -0,0 +1,88 @@
+"""
+Хэширование паролей Argon2 вне потоков веб-сервера.
+
+Хэширование и проверка выполняются в отдельном пуле процессов
+ограниченного размера: наплыв входов занимает только эти процессы,
+а пул потоков FastAPI и event loop остаются свободными для остальных
+эндпоинтов. Параметры Argon2 задаются через окружение; хэши, созданные
+с другими параметрами, пересчитываются при успешном входе.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError, VerifyMismatchError
+from starlette.concurrency import run_in_threadpool
+
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+
+# 0 - считать в пуле потоков FastAPI без отдельных процессов
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(2, os.cpu_count() or 1))))
+
+ph = PasswordHasher(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM,
+)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def hash_password(password: str) -> str:
+    return ph.hash(password)
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    try:
+        return ph.verify(hashed_password, password)
+    except (VerifyMismatchError, VerificationError, InvalidHashError):
+        return False
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """Хэш создан с параметрами, отличными от текущих"""
+    return ph.check_needs_rehash(hashed_password)
+
+
+def _get_pool():
+    global _pool
+    if PASSWORD_HASH_WORKERS <= 0:
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            # spawn: дочерние процессы не наследуют потоки и соединения с БД
+            _pool = ProcessPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS,
+                mp_context=get_context("spawn")
+            )
+        return _pool
+
+
+async def _run(func, *args):
+    pool = _get_pool()
+    if pool is None:
+        return await run_in_threadpool(func, *args)
+    return await asyncio.wrap_future(pool.submit(func, *args))
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run(hash_password, password)
+
+
+async def verify_password_async(password: str, hashed_password: str) -> bool:
+    return await _run(verify_password, password, hashed_password)
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
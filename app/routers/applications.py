@@ -1,14 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app import models, schemas
-from app.database import get_db
-from app.auth import get_current_user
-from app.utils.sensor_utils import (
-    process_application_rooms
-)
+from app.database import get_db, get_read_db
+from app.auth import get_current_user, invalidate_user
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, keyset_page
+from app.utils.serialization import fast_json_response
+from app.utils.approval_jobs import create_job, job_to_dict, submit_job
+from app.utils.approvals import set_application_status
+from app.utils.export import streaming_export
+from app.utils.user_stats import change_application_status
 
 router = APIRouter(prefix="/applications", tags=["Applications"])
 
+MAX_BATCH_APPROVE = int(os.getenv("MAX_BATCH_APPROVE", "1000"))
+
+def application_to_dict(application: models.Application, user_login: str) -> dict:
+    """Заявка в формате ApplicationResponse"""
+    return {
+        "id": application.id,
+        "user_id": application.user_id,
+        "rooms_config": application.rooms_config,
+        "status": application.status,
+        "rejection_comment": application.rejection_comment,
+        "created_at": application.created_at,
+        "updated_at": application.updated_at,
+        "user_login": user_login
+    }
+
 # ---------- Справочники ----------
 @router.get("/dictionaries", response_model=schemas.DictionariesResponse)
 def get_dictionaries():
@@ -73,106 +96,199 @@ def create_application(
     )
 
     db.add(application)
+    change_application_status(db, current_user.id, None, "pending")
     db.commit()
     db.refresh(application)
 
     # Формируем ответ
-    return {
-        "id": application.id,
-        "user_id": application.user_id,
-        "rooms_config": application.rooms_config,
-        "status": application.status,
-        "rejection_comment": application.rejection_comment,
-        "created_at": application.created_at,
-        "updated_at": application.updated_at,
-        "user_login": current_user.login
-    }
+    return application_to_dict(application, current_user.login)
 
 @router.get("/my", response_model=list[schemas.ApplicationResponse])
 def get_my_applications(
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Получить мои заявки"""
     applications = db.query(models.Application).filter(
         models.Application.user_id == current_user.id
     ).order_by(models.Application.created_at.desc()).all()
 
-    return [
-        {
-            "id": app.id,
-            "user_id": app.user_id,
-            "rooms_config": app.rooms_config,
-            "status": app.status,
-            "rejection_comment": app.rejection_comment,
-            "created_at": app.created_at,
-            "updated_at": app.updated_at,
-            "user_login": current_user.login
-        }
+    return fast_json_response([
+        application_to_dict(app, current_user.login)
         for app in applications
-    ]
+    ])
 
 # ---------- Для админов ----------
+def _filter_applications(
+        query,
+        status_filter: Optional[str],
+        created_from: Optional[datetime],
+        created_to: Optional[datetime]
+):
+    """Фильтры по статусу и периоду создания для админских списков"""
+    if status_filter:
+        query = query.filter(models.Application.status == status_filter)
+    if created_from:
+        query = query.filter(models.Application.created_at >= created_from)
+    if created_to:
+        query = query.filter(models.Application.created_at < created_to)
+    return query
+
+
+def _applications_page(
+        db: Session,
+        status_filter: Optional[str],
+        created_from: Optional[datetime],
+        created_to: Optional[datetime],
+        cursor: Optional[str],
+        limit: int
+):
+    """Страница заявок с логином автора (новые первыми) и заголовки ответа"""
+    query = db.query(models.Application, models.User.login).join(
+        models.User, models.User.id == models.Application.user_id
+    )
+    query = _filter_applications(query, status_filter, created_from, created_to)
+
+    rows, next_cursor = keyset_page(
+        query,
+        models.Application.created_at,
+        models.Application.id,
+        cursor=cursor,
+        limit=limit,
+        key=lambda row: (row[0].created_at, row[0].id)
+    )
+
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return rows, headers
+
+
 @router.get("/admin/all", response_model=list[schemas.ApplicationResponse])
 def get_all_applications(
+    status_filter: Optional[str] = Query(None, alias="status"),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """Получить все заявки (только для админа)"""
+    """
+    Получить все заявки (только для админа).
+    Постранично: курсор следующей страницы приходит в заголовке X-Next-Cursor.
+    """
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
 
-    applications = db.query(models.Application).join(models.User).order_by(
-        models.Application.created_at.desc()
-    ).all()
-
-    return [
-        {
-            "id": app.id,
-            "user_id": app.user_id,
-            "rooms_config": app.rooms_config,
-            "status": app.status,
-            "rejection_comment": app.rejection_comment,
-            "created_at": app.created_at,
-            "updated_at": app.updated_at,
-            "user_login": app.user.login
-        }
-        for app in applications
-    ]
+    applications, headers = _applications_page(
+        db, status_filter, created_from, created_to, cursor, limit
+    )
+
+    return fast_json_response(
+        [application_to_dict(app, user_login) for app, user_login in applications],
+        headers=headers
+    )
 
 
 @router.get("/admin/pending", response_model=list[schemas.ApplicationResponse])
 def get_pending_applications(
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """Получить заявки в ожидании (только для админа)"""
+    """
+    Получить заявки в ожидании (только для админа).
+    Постранично: курсор следующей страницы приходит в заголовке X-Next-Cursor.
+    """
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
 
-    applications = db.query(models.Application).join(models.User).filter(
-        models.Application.status == "pending"
-    ).order_by(models.Application.created_at.desc()).all()
+    applications, headers = _applications_page(
+        db, "pending", created_from, created_to, cursor, limit
+    )
+
+    return fast_json_response(
+        [application_to_dict(app, user_login) for app, user_login in applications],
+        headers=headers
+    )
+
+APPLICATION_EXPORT_COLUMNS = [
+    "application_id", "user_id", "user_login", "status", "rejection_comment",
+    "created_at", "updated_at", "room_index", "room_type", "sensor_ids", "sensors",
+]
+
 
-    return [
-        {
-            **app.__dict__,
-            "user_login": app.user.login
+def _application_export_rows(record):
+    """Одна строка выгрузки на каждую комнату заявки"""
+    application, user_login = record
+    base = {
+        "application_id": application.id,
+        "user_id": application.user_id,
+        "user_login": user_login,
+        "status": application.status,
+        "rejection_comment": application.rejection_comment,
+        "created_at": application.created_at,
+        "updated_at": application.updated_at,
+    }
+
+    rooms_config = application.rooms_config or [{}]
+    for index, room_config in enumerate(rooms_config, start=1):
+        sensor_ids = room_config.get("sensor_ids", [])
+        yield {
+            **base,
+            "room_index": index if room_config else None,
+            "room_type": room_config.get("room_type"),
+            "sensor_ids": sensor_ids,
+            "sensors": [models.SENSOR_KINDS.get(sensor_id) for sensor_id in sensor_ids],
         }
-        for app in applications
-    ]
+
+
+@router.get("/admin/export")
+def export_applications(
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Выгрузка заявок в CSV или NDJSON (только для админа).
+    Отдаётся потоком, по строке на каждую комнату заявки.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+    def build_query(db: Session):
+        query = select(models.Application, models.User.login).join(
+            models.User, models.User.id == models.Application.user_id
+        )
+        query = _filter_applications(query, status_filter, created_from, created_to)
+        return query.order_by(models.Application.created_at, models.Application.id)
+
+    return streaming_export(
+        build_query,
+        _application_export_rows,
+        APPLICATION_EXPORT_COLUMNS,
+        export_format,
+        filename="applications"
+    )
 
 @router.get("/admin/{user_id}/applications", response_model=list[schemas.ApplicationResponse])
 def get_user_applications(
         user_id: int,
         current_user: models.User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ):
     """Получить все заявки пользователя (только для админа)"""
     if not current_user.is_admin:
@@ -193,25 +309,75 @@ def get_user_applications(
         models.Application.user_id == user_id
     ).order_by(models.Application.created_at.desc()).all()
 
-    return [
-        {
-            "id": app.id,
-            "user_id": app.user_id,
-            "rooms_config": app.rooms_config,
-            "status": app.status,
-            "rejection_comment": app.rejection_comment,
-            "created_at": app.created_at,
-            "updated_at": app.updated_at,
-            "user_login": user.login
-        }
+    return fast_json_response([
+        application_to_dict(app, user.login)
         for app in applications
-    ]
+    ])
+
+@router.post(
+    "/admin/batch-approve",
+    response_model=schemas.ApprovalJobResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+def batch_approve_applications(
+        batch: schemas.BatchApproveRequest,
+        current_user: models.User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    """
+    Поставить одобрение нескольких заявок в очередь (только для админа).
+    Ход выполнения - GET /applications/admin/jobs/{job_id}.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+    if not batch.application_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="application_ids must not be empty"
+        )
+
+    if len(batch.application_ids) > MAX_BATCH_APPROVE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_APPROVE} applications per batch"
+        )
+
+    job = create_job(db, current_user.id, batch.application_ids)
+    submit_job(job.id)
+    return job_to_dict(job)
+
+
+@router.get("/admin/jobs/{job_id}", response_model=schemas.ApprovalJobResponse)
+def get_approval_job(
+        job_id: int,
+        current_user: models.User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    """Прогресс и результаты пакетного одобрения (только для админа)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+    job = db.get(models.ApprovalJob, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+
+    return job_to_dict(job)
 
 @router.get("/{application_id}", response_model=schemas.ApplicationResponse)
 def get_application(
     application_id: int,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Получить заявку по ID"""
     application = db.query(models.Application).join(models.User).filter(
@@ -231,16 +397,7 @@ def get_application(
             detail="Not enough permissions"
         )
 
-    return {
-        "id": application.id,
-        "user_id": application.user_id,
-        "rooms_config": application.rooms_config,
-        "status": application.status,
-        "rejection_comment": application.rejection_comment,
-        "created_at": application.created_at,
-        "updated_at": application.updated_at,
-        "user_login": application.user.login
-    }
+    return application_to_dict(application, application.user.login)
 
 
 @router.put("/{application_id}")
@@ -274,31 +431,13 @@ def update_application_status(
         )
 
     try:
-        # Обновляем статус и комментарий
-        application.status = status_data.status
-        application.rejection_comment = status_data.rejection_comment if status_data.status == "rejected" else None
-
-        if status_data.status == "approved":
-            # ОДОБРЕНИЕ: application_submitted = true
-            user = db.query(models.User).filter(
-                models.User.id == application.user_id
-            ).first()
-
-            if not user:
-                raise Exception("User not found")
-
-            user.application_submitted = True
-
-            if not application.rooms_config:
-                raise Exception("Application has no rooms_config")
-            # Используем новую утилиту для обработки всех комнат
-            created_room_ids = process_application_rooms(
-                db=db,
-                user_id=application.user_id,
-                rooms_config=application.rooms_config
-            )
+        # Обновляем статус и комментарий, при одобрении создаём комнаты
+        user = set_application_status(
+            db, application, status_data.status, status_data.rejection_comment
+        )
 
-            application.created_room_ids = created_room_ids
+        if user:
+            invalidate_user(db, user.login)
 
         db.commit()
         db.refresh(application)
@@ -1,7 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 from app import models, schemas
-from app.database import get_db
+from app.database import get_async_db
+from app.utils.live_state import get_room_sensors_async, notify_sensor_updates
+from app.utils.sensor_utils import GAS_STATUSES
 import logging
 
 from app.models import SENSOR_NAMES
@@ -45,9 +48,9 @@ logger = logging.getLogger(__name__)
 }
 '''
 @router.post("/send-data", response_model=schemas.ArduinoDataResponse)
-def receive_arduino_data(
+async def receive_arduino_data(
         data: schemas.ArduinoDataCreate,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     print('📥 Получены данные от Arduino:')
     print('=' * 50)
@@ -111,9 +114,7 @@ def receive_arduino_data(
 
     print('=' * 50)
     # Проверяем, что комната существует
-    room = db.query(models.Room).filter(
-        models.Room.id == data.room_id
-    ).first()
+    room = await db.get(models.Room, data.room_id)
 
     if not room:
         raise HTTPException(
@@ -123,24 +124,25 @@ def receive_arduino_data(
 
     processed_count = 0
     errors = []
+    updates = []
+
+    # Датчики комнаты из памяти (один запрос, если комнаты там ещё нет)
+    room_sensors = {sensor.id: sensor for sensor in await get_room_sensors_async(db, room.id)}
 
     # Обрабатываем каждый датчик
     for sensor_data in data.sensors:
         try:
-            if sensor_data.type == "temperature":
-                process_temperature_sensor(db, room, sensor_data)
-            elif sensor_data.type == "light":
-                process_light_sensor(db, room, sensor_data)
-            elif sensor_data.type == "gas":
-                process_gas_sensor(db, room, sensor_data)
-            elif sensor_data.type == "humidity":
-                process_humidity_sensor(db, room, sensor_data)
-            elif sensor_data.type == "ventilation":
-                process_ventilation_sensor(db, room, sensor_data)
-            else:
+            process = SENSOR_PROCESSORS.get(sensor_data.type)
+            if process is None:
                 errors.append(f"Unknown sensor type: {sensor_data.type}")
                 continue
 
+            sensor = room_sensors.get(sensor_data.sensor_db_id)
+            if sensor is None or sensor.type != sensor_data.type:
+                raise ValueError(f"{sensor_data.type.capitalize()} sensor not found in this room")
+
+            updates.append((sensor.id, process(sensor_data)))
+
             processed_count += 1
             logger.info(f"Processed {sensor_data.type} sensor {sensor_data.sensor_db_id} in room {room.name}")
 
@@ -149,7 +151,14 @@ def receive_arduino_data(
             errors.append(error_msg)
             logger.error(error_msg)
 
-    db.commit()
+    # Все значения записываются одним UPDATE по первичному ключу
+    if updates:
+        await db.execute(
+            update(models.Sensor),
+            [{"id": sensor_id, **columns} for sensor_id, columns in updates]
+        )
+        notify_sensor_updates(db, updates)
+    await db.commit()
 
     return {
         "room_id": room.id,
@@ -161,89 +170,49 @@ def receive_arduino_data(
     }
 
 
-# Функции обработки для каждого типа датчика
-def process_temperature_sensor(db: Session, room: models.Room, data: schemas.SensorData):
+# Функции обработки для каждого типа датчика: возвращают новые значения колонок
+def process_temperature_sensor(data: schemas.SensorData) -> dict:
     if data.value is None:
         raise ValueError("Temperature value is required")
 
-    sensor = db.query(models.TemperatureSensor).filter(
-        models.TemperatureSensor.id == data.sensor_db_id,
-        models.TemperatureSensor.room_id == room.id
-    ).first()
-
-    if not sensor:
-        raise ValueError("Temperature sensor not found in this room")
+    return {"value": float(data.value)}
 
-    sensor.value = data.value
 
-
-def process_light_sensor(db: Session, room: models.Room, data: schemas.SensorData):
+def process_light_sensor(data: schemas.SensorData) -> dict:
     is_on = data.is_on if data.is_on is not None else data.value
 
     if is_on is None:
         raise ValueError("Light state is required")
 
-    sensor = db.query(models.LightSensor).filter(
-        models.LightSensor.id == data.sensor_db_id,
-        models.LightSensor.room_id == room.id
-    ).first()
-
-    if not sensor:
-        raise ValueError("Light sensor not found in this room")
+    return {"is_on": bool(is_on)}
 
-    sensor.is_on = bool(is_on)
 
+def process_gas_sensor(data: schemas.SensorData) -> dict:
+    value = data.value if data.value is None else bool(data.value)
 
-def process_gas_sensor(db: Session, room: models.Room, data: schemas.SensorData):
-    value = data.value
+    return {"is_on": value, "status": GAS_STATUSES[value]}
 
-    if value is None:
-        status = "Данных нет"
-    elif value is True:
-        status = "Повышенное количество CO2"
-    else:
-        status = "Газ не обнаружен"
 
-    sensor = db.query(models.GasSensor).filter(
-        models.GasSensor.id == data.sensor_db_id,
-        models.GasSensor.room_id == room.id
-    ).first()
-
-    if not sensor:
-        raise ValueError("Gas sensor not found in this room")
-
-    sensor.value = value
-    sensor.status = status
-
-
-def process_humidity_sensor(db: Session, room: models.Room, data: schemas.SensorData):
+def process_humidity_sensor(data: schemas.SensorData) -> dict:
     humidity = data.humidity_level
 
     if humidity is None:
         raise ValueError("Humidity value is required")
 
-    sensor = db.query(models.HumiditySensor).filter(
-        models.HumiditySensor.id == data.sensor_db_id,
-        models.HumiditySensor.room_id == room.id
-    ).first()
+    return {"value": float(humidity)}
 
-    if not sensor:
-        raise ValueError("Humidity sensor not found in this room")
 
-    sensor.humidity_level = float(humidity)
-
-
-def process_ventilation_sensor(db: Session, room: models.Room, data: schemas.SensorData):
+def process_ventilation_sensor(data: schemas.SensorData) -> dict:
     if data.is_on is None:
         raise ValueError("Ventilation state is required")
 
-    sensor = db.query(models.VentilationSensor).filter(
-        models.VentilationSensor.id == data.sensor_db_id,
-        models.VentilationSensor.room_id == room.id
-    ).first()
+    return {"is_on": bool(data.is_on)}
 
-    if not sensor:
-        raise ValueError("Ventilation sensor not found in this room")
-
-    sensor.is_on = bool(data.is_on)
 
+SENSOR_PROCESSORS = {
+    "temperature": process_temperature_sensor,
+    "light": process_light_sensor,
+    "gas": process_gas_sensor,
+    "humidity": process_humidity_sensor,
+    "ventilation": process_ventilation_sensor,
+}
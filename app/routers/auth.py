@@ -1,23 +1,76 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import math
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from starlette.concurrency import run_in_threadpool
 from app import models, schemas
 from app.auth import (
-    get_password_hash,
-    verify_password,
     create_access_token,
     create_refresh_token,
     verify_refresh_token,
     get_current_user,
-    create_token_data
+    create_token_data,
+    has_pending_application,
+    invalidate_user
 )
 from app.database import get_db
+from app.utils.throttle import SlidingWindowThrottle
+from app.utils.user_stats import get_user_stats, stats_to_dict
+from app.passwords import hash_password_async, needs_rehash, verify_password_async
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
+# Ограничение неудачных входов: по логину (подбор пароля к одному
+# аккаунту) и по IP (перебор логинов). Проверяется до поиска
+# пользователя и Argon2, поэтому отклонённая попытка почти ничего не стоит.
+login_throttle = SlidingWindowThrottle(
+    max_attempts=int(os.getenv("LOGIN_THROTTLE_PER_LOGIN", "5")),
+    window=float(os.getenv("LOGIN_THROTTLE_WINDOW", "300")),
+    base_delay=float(os.getenv("LOGIN_THROTTLE_BASE_DELAY", "30")),
+    max_delay=float(os.getenv("LOGIN_THROTTLE_MAX_DELAY", "3600")),
+)
+ip_throttle = SlidingWindowThrottle(
+    max_attempts=int(os.getenv("LOGIN_THROTTLE_PER_IP", "30")),
+    window=float(os.getenv("LOGIN_THROTTLE_WINDOW", "300")),
+    base_delay=float(os.getenv("LOGIN_THROTTLE_BASE_DELAY", "30")),
+    max_delay=float(os.getenv("LOGIN_THROTTLE_MAX_DELAY", "3600")),
+)
+
+
+def user_to_dict(user: models.User, has_pending: bool) -> dict:
+    """Пользователь в формате UserResponse"""
+    return {
+        "id": user.id,
+        "login": user.login,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "middle_name": user.middle_name,
+        "is_active": user.is_active,
+        "is_admin": user.is_admin,
+        "application_submitted": user.application_submitted,
+        "has_pending_application": has_pending
+    }
+
+
+def user_profile(user: models.User, stats: models.UserStats) -> dict:
+    """Профиль в формате UserProfileResponse по строке user_stats"""
+    return {
+        **user_to_dict(user, stats.pending_applications > 0),
+        "created_at": user.created_at,
+        **stats_to_dict(stats),
+    }
+
+# Эндпоинты с паролями асинхронные: Argon2 считается в пуле процессов
+# (app.passwords), а запросы к БД - в пуле потоков, так что ожидание
+# хэша не занимает поток, нужный другим эндпоинтам.
+def _find_user(db: Session, login: str):
+    return db.query(models.User).filter(models.User.login == login).first()
+
+
 @router.post("/register", response_model=schemas.UserResponse)
-def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(models.User).filter(models.User.login == user_data.login).first()
+async def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
+    existing_user = await run_in_threadpool(_find_user, db, user_data.login)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -26,7 +79,7 @@ def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
 
     new_user = models.User(
         login=user_data.login,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await hash_password_async(user_data.password),
         first_name=user_data.first_name,
         last_name=user_data.last_name,
         middle_name=user_data.middle_name,
@@ -34,32 +87,52 @@ def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
         application_submitted=False
     )
 
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    def save():
+        db.add(new_user)
+        db.flush()
+        db.add(models.UserStats(user_id=new_user.id))
+        db.commit()
+        db.refresh(new_user)
 
-    return {
-        "id": new_user.id,
-        "login": new_user.login,
-        "first_name": new_user.first_name,
-        "last_name": new_user.last_name,
-        "middle_name": new_user.middle_name,
-        "is_active": new_user.is_active,
-        "is_admin": new_user.is_admin,
-        "application_submitted": new_user.application_submitted,
-        "has_pending_application": False
-    }
+    await run_in_threadpool(save)
+
+    return user_to_dict(new_user, has_pending=False)
 
 @router.post("/login", response_model=schemas.TokenPair)
-def login(data: schemas.UserAuth, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.login == data.login).first()
-    if not user or not verify_password(data.password, user.hashed_password):
+async def login(data: schemas.UserAuth, request: Request, db: Session = Depends(get_db)):
+    client_ip = request.client.host if request.client else "unknown"
+
+    # Попытка занимается до поиска пользователя и Argon2: параллельные
+    # запросы сверх лимита получают 429, не дойдя до хэширования
+    retry_after = ip_throttle.attempt(client_ip)
+    if not retry_after:
+        retry_after = login_throttle.attempt(data.login)
+        if retry_after:
+            ip_throttle.succeeded(client_ip)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+    user = await run_in_threadpool(_find_user, db, data.login)
+    if not user or not await verify_password_async(data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
         )
 
-    token_data = create_token_data(user, db)
+    login_throttle.reset(data.login)
+    ip_throttle.succeeded(client_ip)
+
+    # Хэш со старыми параметрами Argon2 пересчитываем, пока знаем пароль
+    if needs_rehash(user.hashed_password):
+        user.hashed_password = await hash_password_async(data.password)
+        invalidate_user(db, user.login)
+        await run_in_threadpool(db.commit)
+
+    token_data = await run_in_threadpool(create_token_data, user, db)
     access_token = create_access_token(token_data)
     refresh_token = create_refresh_token(token_data)
 
@@ -97,42 +170,27 @@ def refresh_token(refresh_data: schemas.RefreshToken, db: Session = Depends(get_
     }
 
 @router.post("/change_password")
-def change_password(
+async def change_password(
     data: schemas.PasswordChange,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    if not verify_password(data.old_password, current_user.hashed_password):
+    if not await verify_password_async(data.old_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Old password is incorrect"
         )
 
-    current_user.hashed_password = get_password_hash(data.new_password)
-    db.commit()
+    current_user.hashed_password = await hash_password_async(data.new_password)
+    invalidate_user(db, current_user.login)
+    await run_in_threadpool(db.commit)
     return {"message": "Password successfully changed"}
 
 
 @router.get("/me", response_model=schemas.UserResponse)
 def get_current_user_info(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    # Получаем информацию о pending заявках
-    has_pending = db.query(models.Application).filter(
-        models.Application.user_id == current_user.id,
-        models.Application.status.in_(["pending", "rejected"])
-    ).first() is not None
-
-    # Возвращаем словарь с добавленным полем
-    return {
-        "id": current_user.id,
-        "login": current_user.login,
-        "first_name": current_user.first_name,
-        "last_name": current_user.last_name,
-        "middle_name": current_user.middle_name,
-        "is_active": current_user.is_active,
-        "is_admin": current_user.is_admin,
-        "application_submitted": current_user.application_submitted,
-        "has_pending_application": has_pending
-    }
+    # Возвращаем словарь с добавленным полем о pending заявках
+    return user_to_dict(current_user, has_pending_application(db, current_user.id))
 
 
 @router.get("/profile", response_model=schemas.UserProfileResponse)
@@ -141,63 +199,7 @@ def get_user_profile(
         db: Session = Depends(get_db)
 ):
     """Получить профиль пользователя со статистикой"""
-    # Статистика по заявкам
-    total_applications = db.query(func.count(models.Application.id)).filter(
-        models.Application.user_id == current_user.id
-    ).scalar() or 0
-
-    pending_applications = db.query(func.count(models.Application.id)).filter(
-        models.Application.user_id == current_user.id,
-        models.Application.status == "pending"
-    ).scalar() or 0
-
-    approved_applications = db.query(func.count(models.Application.id)).filter(
-        models.Application.user_id == current_user.id,
-        models.Application.status == "approved"
-    ).scalar() or 0
-
-    rejected_applications = db.query(func.count(models.Application.id)).filter(
-        models.Application.user_id == current_user.id,
-        models.Application.status == "rejected"
-    ).scalar() or 0
-
-    # Статистика по комнатам и датчикам (только для одобренных заявок)
-    approved_application = db.query(models.Application).filter(
-        models.Application.user_id == current_user.id,
-        models.Application.status == "approved"
-    ).first()
-
-    total_rooms = 0
-    total_sensors = 0
-
-    if approved_application:
-        total_rooms = len(approved_application.rooms_config)
-        total_sensors = sum(len(rc.get("sensor_ids", [])) for rc in approved_application.rooms_config)
-
-    # Получаем pending заявки для has_pending_application
-    has_pending = db.query(models.Application).filter(
-        models.Application.user_id == current_user.id,
-        models.Application.status == "pending"
-    ).first() is not None
-
-    return {
-        "id": current_user.id,
-        "login": current_user.login,
-        "first_name": current_user.first_name,
-        "last_name": current_user.last_name,
-        "middle_name": current_user.middle_name,
-        "is_active": current_user.is_active,
-        "is_admin": current_user.is_admin,
-        "application_submitted": current_user.application_submitted,
-        "has_pending_application": has_pending,
-        "created_at": current_user.created_at,
-        "total_applications": total_applications,
-        "pending_applications": pending_applications,
-        "approved_applications": approved_applications,
-        "rejected_applications": rejected_applications,
-        "total_rooms": total_rooms,
-        "total_sensors": total_sensors
-    }
+    return user_profile(current_user, get_user_stats(db, current_user.id))
 
 @router.put("/profile", response_model=schemas.UserProfileResponse)
 def update_user_profile(
@@ -214,8 +216,9 @@ def update_user_profile(
     if user_data.middle_name is not None:
         current_user.middle_name = user_data.middle_name
 
+    invalidate_user(db, current_user.login)
     db.commit()
     db.refresh(current_user)
 
     # Возвращаем обновленный профиль со статистикой
-    return get_user_profile(current_user=current_user, db=db)
\ No newline at end of file
+    return user_profile(current_user, get_user_stats(db, current_user.id))
\ No newline at end of file
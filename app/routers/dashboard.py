@@ -0,0 +1,77 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.auth import get_current_user, has_pending_application
+from app.database import get_read_db
+from app.routers.auth import user_to_dict
+from app.utils.sensor_utils import group_room_sensors, load_user_rooms, user_room_info
+
+router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
+
+
+@router.get("", response_model=schemas.DashboardResponse)
+def get_dashboard(
+        db: Session = Depends(get_read_db),
+        current_user: models.User = Depends(get_current_user)
+):
+    """
+    Всё, что нужно приложению при запуске, одним запросом:
+    /auth/me, /rooms/user/rooms, /sensors/room/{id} по каждой комнате,
+    /outdoor-temperature/latest, /outdoor-light/latest и /home-control/mode.
+    Число запросов к БД не зависит от количества комнат и датчиков.
+    """
+    rooms = []
+    for room, sensors in load_user_rooms(db, current_user.id):
+        room_info = user_room_info(room, sensors)
+        rooms.append(schemas.DashboardRoom(
+            **room_info.model_dump(),
+            state={
+                "room_id": room.id,
+                "room_name": room.name,
+                **group_room_sensors(sensors),
+            }
+        ))
+
+    outdoor_temperature = (
+        db.query(models.OutdoorTemperature)
+        .filter(models.OutdoorTemperature.user_id == current_user.id)
+        .order_by(models.OutdoorTemperature.created_at.desc())
+        .first()
+    )
+
+    outdoor_light = (
+        db.query(models.OutdoorLight)
+        .filter(models.OutdoorLight.user_id == current_user.id)
+        .order_by(models.OutdoorLight.created_at.desc())
+        .first()
+    )
+
+    # В отличие от GET /home-control/mode режим здесь не создаётся:
+    # при его отсутствии отдаём режим по умолчанию
+    mode = db.query(models.HomeControlMode).filter(
+        models.HomeControlMode.user_id == current_user.id
+    ).first()
+
+    now = datetime.utcnow()
+
+    return {
+        "user": user_to_dict(current_user, has_pending_application(db, current_user.id)),
+        "rooms": rooms,
+        "outdoor_temperature": outdoor_temperature or schemas.OutdoorTemperatureResponse(
+            temperatures=[],
+            min_temperature=0.0,
+            max_temperature=0.0,
+            created_at=now,
+        ),
+        "outdoor_light": outdoor_light or schemas.OutdoorLightResponse(
+            is_on=False,
+            created_at=now,
+        ),
+        "home_control_mode": mode or schemas.HomeControlModeResponse(
+            is_manual=False,
+            updated_at=now,
+        ),
+    }
@@ -5,6 +5,8 @@ from app.auth import get_current_user
 from app.database import get_db
 from app import models, schemas
 from app.schemas import ToggleOutdoorLightRequest
+from app.utils.live_state import notify_sensor_updates
+from app.utils.tenant import UserScope
 
 router = APIRouter(prefix="/home-control", tags=["Home Control"])
 
@@ -67,21 +69,14 @@ def toggle_device(
     # Преобразуем sensor_id к int (если приходит из фронта как строка)
     sensor_id = int(data.sensor_id)
 
-    if data.type == "light":
-        device = db.query(models.LightSensor).filter(
-            models.LightSensor.room_id == data.room_id,
-            models.LightSensor.id == sensor_id
-        ).first()
-    else:  # ventilation
-        device = db.query(models.VentilationSensor).filter(
-            models.VentilationSensor.room_id == data.room_id,
-            models.VentilationSensor.id == sensor_id
-        ).first()
-
-    if not device:
+    # Только устройства в комнатах пользователя
+    device = UserScope(current_user.id).get_sensor(db, sensor_id)
+
+    if not device or device.room_id != data.room_id or device.type != data.type:
         raise HTTPException(status_code=404, detail="Device not found")
 
     device.is_on = data.is_on
+    notify_sensor_updates(db, [(device.id, {"is_on": data.is_on})])
     db.commit()
     db.refresh(device)
 
@@ -0,0 +1,178 @@
+import hmac
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy.exc import DBAPIError
+
+from app import models
+from app.auth import get_current_user, token_cache, user_cache
+from app.database import async_engine, async_read_engine, engine, read_engine, sqlite_writer_lock
+from app.routers.auth import ip_throttle, login_throttle
+from app.routers.users import users_snapshot_cache
+from app.utils import invalidation
+from app.utils.db_pool import pool_stats
+from app.utils.live_state import live_state
+from app.utils.metrics import render_histogram, render_type, render_value, request_metrics
+from app.migrations import SCHEMA_VERSION
+from app.utils.query_stats import statement_seconds
+from app.utils.startup import ping, readiness
+
+router = APIRouter(prefix="/internal", tags=["Internal"])
+
+# Отдельный роутер без префикса: Prometheus по умолчанию ходит на /metrics
+metrics_router = APIRouter(tags=["Internal"])
+
+# Метрики раскрывают маршруты, нагрузку и состояние БД. Если токен задан,
+# /metrics требует "Authorization: Bearer <METRICS_TOKEN>" (в Prometheus -
+# authorization.credentials). Без токена /metrics открыт всем, и наружу
+# его нельзя публиковать: только во внутренней сети или за прокси.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Проверки для оркестратора (app/utils/startup.py), тоже без префикса
+health_router = APIRouter(tags=["Internal"])
+
+
+def engine_pools() -> dict:
+    pools = {
+        "sync": engine.pool,
+        "async": async_engine.pool,
+    }
+    if read_engine is not engine:
+        pools["read"] = read_engine.pool
+    if async_read_engine is not async_engine:
+        pools["async_read"] = async_read_engine.pool
+    return pools
+
+
+@router.get("/pool")
+def get_pool_stats(current_user: models.User = Depends(get_current_user)):
+    """Состояние пулов соединений с БД (только для админа)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+    return {name: pool_stats(pool) for name, pool in engine_pools().items()}
+
+
+# Все строки одной метрики идут подряд после своей строки # TYPE
+POOL_GAUGES = ("size", "checked_out", "checked_in", "overflow")
+
+
+def _pool_lines() -> list:
+    pools = {name: (pool, pool_stats(pool)) for name, pool in engine_pools().items()}
+    lines = []
+    for key in POOL_GAUGES:
+        lines.append(render_type(f"db_pool_{key}", "gauge"))
+        for name, (pool, stats) in pools.items():
+            if key in stats:
+                lines.append(render_value(f"db_pool_{key}", stats[key], pool=name))
+
+    timed = {name: (pool, stats) for name, (pool, stats) in pools.items() if "timeouts" in stats}
+    lines.append(render_type("db_pool_timeouts_total", "counter"))
+    for name, (pool, stats) in timed.items():
+        lines.append(render_value("db_pool_timeouts_total", stats["timeouts"], pool=name))
+    lines.append(render_type("db_pool_wait_seconds", "histogram"))
+    for name, (pool, stats) in timed.items():
+        lines += render_histogram("db_pool_wait_seconds", pool.wait_time, pool=name)
+    return lines
+
+
+def _cache_lines() -> list:
+    caches = {"user": user_cache, "token": token_cache, "users_snapshot": users_snapshot_cache}
+    stats = {name: cache.stats() for name, cache in caches.items()}
+    lines = []
+    for metric, key, kind in (
+        ("cache_hits_total", "hits", "counter"),
+        ("cache_misses_total", "misses", "counter"),
+        ("cache_size", "size", "gauge"),
+    ):
+        lines.append(render_type(metric, kind))
+        for name, cache_stats in stats.items():
+            lines.append(render_value(metric, cache_stats[key], cache=name))
+    return lines
+
+
+def _throttle_lines() -> list:
+    stats = {name: throttle.stats() for name, throttle in (("login", login_throttle), ("ip", ip_throttle))}
+    lines = []
+    for metric, key, kind in (
+        ("login_throttle_blocked_total", "blocked", "counter"),
+        ("login_throttle_failed_total", "failed", "counter"),
+        ("login_throttle_blocked_keys", "blocked_keys", "gauge"),
+    ):
+        lines.append(render_type(metric, kind))
+        for name, throttle_stats in stats.items():
+            lines.append(render_value(metric, throttle_stats[key], key=name))
+    return lines
+
+
+def check_metrics_token(request: Request):
+    if not METRICS_TOKEN:
+        return
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+
+@metrics_router.get("/metrics", include_in_schema=False, dependencies=[Depends(check_metrics_token)])
+def get_metrics():
+    """Метрики в текстовом формате Prometheus (счётчики этого воркера)"""
+    live = live_state.stats()
+    lines = request_metrics.render()
+    lines += [render_type("db_statement_duration_seconds", "histogram")]
+    lines += render_histogram("db_statement_duration_seconds", statement_seconds)
+    lines += _pool_lines()
+    lines += _cache_lines()
+    lines += _throttle_lines()
+    for metric, value in (
+        ("live_state_sensors", live["sensors"]),
+        ("live_state_rooms", live["rooms"]),
+        ("live_state_bytes", live["bytes"]),
+    ):
+        lines += [render_type(metric, "gauge"), render_value(metric, value)]
+    for metric, key in (
+        ("cache_invalidations_published_total", "published"),
+        ("cache_invalidations_received_total", "received"),
+        ("cache_invalidation_listener_reconnects_total", "reconnects"),
+        ("cache_invalidation_resets_total", "resets"),
+    ):
+        lines += [render_type(metric, "counter"), render_value(metric, invalidation.stats[key])]
+    if sqlite_writer_lock is not None:
+        lines += [
+            render_type("sqlite_writer_lock_timeouts_total", "counter"),
+            render_value("sqlite_writer_lock_timeouts_total", sqlite_writer_lock.timeouts),
+            render_type("sqlite_writer_lock_wait_seconds", "histogram"),
+        ]
+        lines += render_histogram("sqlite_writer_lock_wait_seconds", sqlite_writer_lock.wait_time)
+    if readiness.startup_seconds is not None:
+        lines += [
+            render_type("app_startup_seconds", "gauge"),
+            render_value("app_startup_seconds", readiness.startup_seconds),
+        ]
+    return Response("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+
+@health_router.get("/healthz", include_in_schema=False)
+def healthz():
+    """Процесс жив и обрабатывает запросы"""
+    return {"status": "ok"}
+
+
+@health_router.get("/readyz", include_in_schema=False)
+def readyz():
+    """Старт завершён и основная БД отвечает"""
+    if not readiness.ready:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Starting")
+
+    try:
+        ping(engine)
+    except DBAPIError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database unavailable")
+
+    return {"status": "ready", "schema_version": SCHEMA_VERSION}
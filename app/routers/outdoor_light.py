@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime
 
 from app import models, schemas
-from app.database import get_db
-from app.auth import get_current_user
+from app.database import get_db, get_read_async_db
+from app.auth import get_current_user, get_current_user_async
 
 router = APIRouter(prefix="/outdoor-light", tags=["Outdoor Light"])
 
@@ -31,15 +33,15 @@ def receive_outdoor_light(
     )
 
 @router.get("/latest", response_model=schemas.OutdoorLightResponse)
-def get_latest_outdoor_light(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def get_latest_outdoor_light(
+    db: AsyncSession = Depends(get_read_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
-    record = (
-        db.query(models.OutdoorLight)
-        .filter(models.OutdoorLight.user_id == current_user.id)
+    record = await db.scalar(
+        select(models.OutdoorLight)
+        .where(models.OutdoorLight.user_id == current_user.id)
         .order_by(models.OutdoorLight.created_at.desc())
-        .first()
+        .limit(1)
     )
 
     if not record:
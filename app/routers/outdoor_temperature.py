@@ -1,10 +1,12 @@
 from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.auth import get_current_user
-from app.database import get_db
+from app.auth import get_current_user, get_current_user_async
+from app.database import get_db, get_read_async_db
 from app import models, schemas
 
 
@@ -55,15 +57,15 @@ def receive_outdoor_temperature(
 
 # Получение списка температур вокруг дома для пользователя
 @router.get("/latest", response_model=schemas.OutdoorTemperatureResponse)
-def get_latest_outdoor_temperature(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def get_latest_outdoor_temperature(
+    db: AsyncSession = Depends(get_read_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
-    record = (
-        db.query(models.OutdoorTemperature)
-        .filter(models.OutdoorTemperature.user_id == current_user.id)
+    record = await db.scalar(
+        select(models.OutdoorTemperature)
+        .where(models.OutdoorTemperature.user_id == current_user.id)
         .order_by(models.OutdoorTemperature.created_at.desc())
-        .first()
+        .limit(1)
     )
 
     if not record:
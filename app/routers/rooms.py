@@ -1,43 +1,41 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from .. import models, schemas
 from ..auth import get_current_user
-from ..database import get_db
+from ..database import get_db, get_read_async_db, get_read_db
+from ..utils.live_state import get_room_sensors_async
+from ..utils.sensor_utils import load_user_rooms, user_room_info
+from ..utils.tenant import UserScope, user_scope, user_scope_async
+from ..utils.user_stats import get_user_stats, stats_to_dict
 
 router = APIRouter(prefix="/rooms", tags=["Rooms"])
 
-SENSOR_MODELS = {
-    "temperature": models.TemperatureSensor,
-    "light": models.LightSensor,
-    "gas": models.GasSensor,
-    "humidity": models.HumiditySensor,
-    "ventilation": models.VentilationSensor,
-}
-
 @router.get("/", response_model=list[schemas.RoomResponse])
 def get_rooms(
-        db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
+        db: Session = Depends(get_read_db),
+        scope: UserScope = Depends(user_scope)
 ):
-    """Получить список всех комнат с датчиками"""
-    rooms = db.query(models.Room).all()
+    """Получить список комнат пользователя с датчиками"""
+    rooms = scope.get_rooms(db)
+
+    # Количество датчиков по типам для комнат пользователя одним запросом
+    counts = db.execute(scope.sensor_counts_query()).all()
+
+    sensors_by_room = {}
+    for room_id, sensor_type, count in counts:
+        sensors_by_room.setdefault(room_id, {})[sensor_type] = count
 
     result = []
     for room in rooms:
-        sensors_info = []
+        room_counts = sensors_by_room.get(room.id, {})
 
         # Собираем информацию по типам датчиков
-        if room.temperature_sensors:
-            sensors_info.append({"type": "temperature", "count": len(room.temperature_sensors)})
-        if room.light_sensors:
-            sensors_info.append({"type": "light", "count": len(room.light_sensors)})
-        if room.gas_sensors:
-            sensors_info.append({"type": "gas", "count": len(room.gas_sensors)})
-        if room.humidity_sensors:
-            sensors_info.append({"type": "humidity", "count": len(room.humidity_sensors)})
-        if room.ventilation_sensors:
-            sensors_info.append({"type": "ventilation", "count": len(room.ventilation_sensors)})
-
+        sensors_info = [
+            {"type": kind, "count": room_counts[kind]}
+            for kind in models.SENSOR_KINDS.values()
+            if room_counts.get(kind)
+        ]
 
         result.append({
             "id": room.id,
@@ -47,161 +45,61 @@ def get_rooms(
 
     return result
 
+@router.get("/stats", response_model=schemas.ProfileStatsResponse)
+def get_rooms_stats(
+        db: Session = Depends(get_db),
+        current_user: models.User = Depends(get_current_user)
+):
+    """Получить статистику по комнатам и датчикам пользователя"""
+    return stats_to_dict(get_user_stats(db, current_user.id))
+
 @router.get("/{room_id}", response_model=schemas.RoomResponse)
 def get_room_by_id(
     room_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    scope: UserScope = Depends(user_scope)
 ):
     """Получить информацию о конкретной комнате"""
-    room = db.query(models.Room).filter(models.Room.id == room_id).first()
+    room = scope.get_room(db, room_id)
 
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     return room
 
-@router.get("/stats", response_model=schemas.ProfileStatsResponse)
-def get_rooms_stats(
-        db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
-):
-    """Получить статистику по комнатам и датчикам пользователя"""
-    # Находим одобренную заявку пользователя
-    approved_application = db.query(models.Application).filter(
-        models.Application.user_id == current_user.id,
-        models.Application.status == "approved"
-    ).first()
-
-    total_rooms = 0
-    total_sensors = 0
-
-    if approved_application:
-        total_rooms = len(approved_application.rooms_config)
-        total_sensors = sum(len(rc.get("sensor_ids", [])) for rc in approved_application.rooms_config)
-
-    return {
-        "total_rooms": total_rooms,
-        "total_sensors": total_sensors,
-        "total_applications": 0,  # Заполнятся отдельно
-        "pending_applications": 0,
-        "approved_applications": 0,
-        "rejected_applications": 0
-    }
-
-
 @router.get("/user/rooms", response_model=list[schemas.UserRoomsResponse])
 def get_user_rooms(
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         current_user: models.User = Depends(get_current_user)
 ):
     """Получить комнаты и датчики пользователя (только одобренные заявки)"""
-    # Находим одобренную заявку пользователя
-    approved_application = db.query(models.Application).filter(
-        models.Application.user_id == current_user.id,
-        models.Application.status == "approved"
-    ).first()
-
-    if not approved_application:
-        return []
-
-    rooms_data = []
-
-    # Берем ID созданных комнат из заявки
-    room_ids = approved_application.created_room_ids or []
-
-    for room_id in room_ids:
-        room = db.query(models.Room).filter(models.Room.id == room_id).first()
-        if not room:
-            continue
-
-        sensors = []
-
-        # Температурные датчики
-        for idx, sensor in enumerate(room.temperature_sensors, start=1):
-            sensors.append(schemas.SensorInfo(
-                id=sensor.id,
-                type="temperature",
-                name=f"Датчик температуры {idx}",
-                room_id=room.id,
-                room_name=room.name
-            ))
-
-        # Датчики освещения
-        for idx, sensor in enumerate(room.light_sensors, start=1):
-            sensors.append(schemas.SensorInfo(
-                id=sensor.id,
-                type="light",
-                name=f"Датчик освещения {idx}",
-                room_id=room.id,
-                room_name=room.name
-            ))
-
-        # Датчики газа
-        for idx, sensor in enumerate(room.gas_sensors, start=1):
-            sensors.append(schemas.SensorInfo(
-                id=sensor.id,
-                type="gas",
-                name=f"Датчик газа {idx}",
-                room_id=room.id,
-                room_name=room.name
-            ))
-
-        # Датчики влажности
-        for idx, sensor in enumerate(room.humidity_sensors, start=1):
-            sensors.append(schemas.SensorInfo(
-                id=sensor.id,
-                type="humidity",
-                name=f"Датчик влажности {idx}",
-                room_id=room.id,
-                room_name=room.name
-            ))
-
-        # Датчики вентиляции
-        for idx, sensor in enumerate(room.ventilation_sensors, start=1):
-            sensors.append(schemas.SensorInfo(
-                id=sensor.id,
-                type="ventilation",
-                name=f"Датчик вентиляции {idx}",
-                room_id=room.id,
-                room_name=room.name
-            ))
-
-        rooms_data.append(schemas.UserRoomsResponse(
-            id=room.id,
-            name=room.name,
-            sensors=sensors
-        ))
-
-    return rooms_data
+    return [
+        user_room_info(room, sensors)
+        for room, sensors in load_user_rooms(db, current_user.id)
+    ]
 
 """Получить комнаты и датчики пользователя для arduino"""
 
 
 @router.get("/{room_id}/devices", response_model=schemas.RoomDevicesResponse)
-def get_room_devices(
+async def get_room_devices(
         room_id: int,
-        db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
+        db: AsyncSession = Depends(get_read_async_db),
+        scope: UserScope = Depends(user_scope_async)
 ):
-    room = db.query(models.Room).filter(models.Room.id == room_id).first()
+    room = await scope.get_room_async(db, room_id)
 
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
 
     devices = {}
 
-    # Датчики света
-    for light in room.light_sensors:
-        devices[str(light.id)] = {
-            "type": "light",
-            "is_on": light.is_on
-        }
-
-    # Датчики вентиляции
-    for fan in room.ventilation_sensors:
-        devices[str(fan.id)] = {
-            "type": "ventilation",
-            "is_on": fan.is_on
+    # Управляемые устройства: свет и вентиляция
+    for sensor in await get_room_sensors_async(db, room.id):
+        if sensor.type not in ("light", "ventilation"):
+            continue
+        devices[str(sensor.id)] = {
+            "type": sensor.type,
+            "is_on": sensor.is_on
         }
 
     response = {
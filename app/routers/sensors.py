@@ -1,39 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app import models, schemas
-from app.auth import get_current_user
-from app.database import get_db
+from app.database import get_read_async_db, get_read_db
+from app.utils.live_state import get_room_sensors_async
+from app.utils.sensor_utils import sensor_to_dict, group_room_sensors
+from app.utils.tenant import UserScope, user_scope, user_scope_async
 
 router = APIRouter(prefix="/sensors", tags=["Sensors"])
 
-SENSOR_MODELS = {
-    "temperature": models.TemperatureSensor,
-    "light": models.LightSensor,
-    "gas": models.GasSensor,
-    "humidity": models.HumiditySensor,
-    "ventilation": models.VentilationSensor,
-}
-
 # ---------- Все датчики в комнате ----------
 @router.get("/room/{room_id}")
-def get_room_sensors(
+async def get_room_sensors(
     room_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_async_db),
+    scope: UserScope = Depends(user_scope_async)
 ):
     """Получить все датчики в конкретной комнате"""
-    room = db.query(models.Room).filter(models.Room.id == room_id).first()
+    room = await scope.get_room_async(db, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
 
+    sensors = await get_room_sensors_async(db, room.id)
+
     sensors_data = {
         "room_id": room.id,
         "room_name": room.name,
-        "temperature_sensors": room.temperature_sensors,
-        "light_sensors": room.light_sensors,
-        "gas_sensors": room.gas_sensors,
-        "humidity_sensors": room.humidity_sensors,
-        "ventilation_sensors": room.ventilation_sensors,
+        **group_room_sensors(sensors),
     }
 
     return sensors_data
@@ -43,21 +36,19 @@ def get_room_sensors(
 def get_sensor_info(
     sensor_type: str,
     sensor_id: int,  # сразу преобразуем к int
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    scope: UserScope = Depends(user_scope)
 ):
-    if sensor_type not in SENSOR_MODELS:
+    if sensor_type not in models.SENSOR_KIND_IDS:
         raise HTTPException(
             status_code=400,
-            detail=f"Invalid sensor type. Available types: {list(SENSOR_MODELS.keys())}"
+            detail=f"Invalid sensor type. Available types: {list(models.SENSOR_KIND_IDS.keys())}"
         )
 
-    sensor_model = SENSOR_MODELS[sensor_type]
-
-    # Ищем по id
-    sensor = db.query(sensor_model).filter(sensor_model.id == sensor_id).first()
+    # Ищем по id среди датчиков пользователя
+    sensor = scope.get_live_sensor(db, sensor_id)
 
-    if not sensor:
+    if not sensor or sensor.type != sensor_type:
         raise HTTPException(status_code=404, detail="Sensor not found")
 
-    return sensor
\ No newline at end of file
+    return sensor_to_dict(sensor)
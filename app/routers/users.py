@@ -1,54 +1,86 @@
 # users.py или добавить в существующий роутер
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
+from sqlalchemy import func, select
+from typing import List, Optional
 from app import models, schemas
-from app.database import get_db
+from app.database import get_read_db
 from app.auth import get_current_user
+from app.utils.cache import TTLCache
+from app.utils.export import streaming_export
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, keyset_page
+from app.utils.serialization import fast_json_response
+from app.utils.user_stats import stats_columns
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
+# Последние собранные страницы списка пользователей для snapshot=true
+USERS_SNAPSHOT_TTL = float(os.getenv("USERS_SNAPSHOT_TTL", "15"))
+users_snapshot_cache = TTLCache(maxsize=256, ttl=USERS_SNAPSHOT_TTL)
+
 
 # ---------- Для админов ----------
 @router.get("/admin/list", response_model=List[schemas.UserListResponse])
 def get_all_users(
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        snapshot: bool = False,
         current_user: models.User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ):
-    """Получить всех пользователей (только для админа)"""
+    """
+    Получить всех пользователей (только для админа).
+    Постранично: курсор следующей страницы приходит в заголовке X-Next-Cursor.
+    snapshot=true - страница из кэша, может отставать на USERS_SNAPSHOT_TTL секунд.
+    """
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
 
-    # Получаем пользователей с количеством заявок
-    users = db.query(
+    snapshot_key = (created_from, created_to, cursor, limit)
+    if snapshot:
+        cached = users_snapshot_cache.get(snapshot_key)
+        if cached is not None:
+            result, headers = cached
+            return fast_json_response(result, headers=headers)
+
+    # Количество заявок по статусам считается в том же запросе
+    # (COUNT(...) FILTER (WHERE status = ...)), без запросов на каждого пользователя
+    status_counts = [
+        func.count(models.Application.id).filter(models.Application.status == app_status)
+        for app_status in ("pending", "approved", "rejected")
+    ]
+    query = db.query(
         models.User,
-        func.count(models.Application.id).label('applications_count')
+        func.count(models.Application.id).label('applications_count'),
+        *status_counts
     ).outerjoin(
         models.Application, models.User.id == models.Application.user_id
-    ).group_by(models.User.id).order_by(models.User.id).all()
+    ).group_by(models.User.id)
 
-    result = []
-    for user, app_count in users:
-        # Получаем количество заявок по статусам
-        pending_count = db.query(func.count(models.Application.id)).filter(
-            models.Application.user_id == user.id,
-            models.Application.status == "pending"
-        ).scalar() or 0
-
-        approved_count = db.query(func.count(models.Application.id)).filter(
-            models.Application.user_id == user.id,
-            models.Application.status == "approved"
-        ).scalar() or 0
-
-        rejected_count = db.query(func.count(models.Application.id)).filter(
-            models.Application.user_id == user.id,
-            models.Application.status == "rejected"
-        ).scalar() or 0
+    if created_from:
+        query = query.filter(models.User.created_at >= created_from)
+    if created_to:
+        query = query.filter(models.User.created_at < created_to)
 
+    users, next_cursor = keyset_page(
+        query,
+        models.User.created_at,
+        models.User.id,
+        cursor=cursor,
+        limit=limit,
+        key=lambda row: (row[0].created_at, row[0].id),
+        descending=False
+    )
+
+    result = []
+    for user, app_count, pending_count, approved_count, rejected_count in users:
         result.append({
             "id": user.id,
             "login": user.login,
@@ -62,6 +94,59 @@ def get_all_users(
             "created_at": user.created_at if hasattr(user, 'created_at') else None
         })
 
-    return result
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    users_snapshot_cache.set(snapshot_key, (result, headers))
+    return fast_json_response(result, headers=headers)
+
+
+USER_COLUMNS = (
+    "id", "login", "first_name", "last_name", "middle_name", "is_active", "is_admin",
+    "application_submitted", "created_at",
+)
+STATS_COLUMNS = (
+    "pending_applications", "approved_applications", "rejected_applications",
+    "total_rooms", "total_sensors",
+)
+USER_EXPORT_COLUMNS = USER_COLUMNS + STATS_COLUMNS
+
+
+def _user_export_rows(record):
+    user = record[0]
+    row = {column: getattr(user, column) for column in USER_COLUMNS}
+    for column in STATS_COLUMNS:
+        row[column] = getattr(record, column)
+    yield row
 
 
+@router.get("/admin/export")
+def export_users(
+        export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        current_user: models.User = Depends(get_current_user)
+):
+    """Выгрузка пользователей со счётчиками в CSV или NDJSON потоком (только для админа)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+    def build_query(db: Session):
+        # Без строки user_stats счётчики считаются по таблицам, а не нули
+        query = select(models.User, *stats_columns(models.User.id)).outerjoin(
+            models.UserStats, models.UserStats.user_id == models.User.id
+        )
+        if created_from:
+            query = query.filter(models.User.created_at >= created_from)
+        if created_to:
+            query = query.filter(models.User.created_at < created_to)
+        return query.order_by(models.User.created_at, models.User.id)
+
+    return streaming_export(
+        build_query,
+        _user_export_rows,
+        USER_EXPORT_COLUMNS,
+        export_format,
+        filename="users"
+    )
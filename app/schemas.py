@@ -1,4 +1,4 @@
-from typing import Optional, List, Dict, Union
+from typing import Optional, List, Dict, Union, Any
 
 from pydantic import BaseModel
 from datetime import datetime
@@ -131,6 +131,26 @@ class ApplicationUpdate(BaseModel):
     status: str  # approved, rejected
     rejection_comment: Optional[str] = None
 
+class BatchApproveRequest(BaseModel):
+    application_ids: List[int]
+
+class ApprovalJobItemResponse(BaseModel):
+    application_id: int
+    status: str  # pending, running, done, failed
+    error: Optional[str] = None
+    finished_at: Optional[datetime] = None
+
+class ApprovalJobResponse(BaseModel):
+    id: int
+    status: str  # queued, running, done
+    total: int
+    processed: int
+    succeeded: int
+    failed: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    items: List[ApprovalJobItemResponse] = []
+
 
 # ---------- Справочники ----------
 class DictionariesResponse(BaseModel):
@@ -312,4 +332,17 @@ class ToggleDeviceRequest(BaseModel):
 class RoomDevicesResponse(BaseModel):
     room_id: int
     room_name: str
-    devices: Dict[str, Dict[str, Union[str, bool]]]
\ No newline at end of file
+    devices: Dict[str, Dict[str, Union[str, bool]]]
+
+# ---------- Главный экран приложения ----------
+class DashboardRoom(UserRoomsResponse):
+    # Состояние датчиков в формате /sensors/room/{id}
+    state: Dict[str, Any] = {}
+
+
+class DashboardResponse(BaseModel):
+    user: UserResponse
+    rooms: List[DashboardRoom]
+    outdoor_temperature: OutdoorTemperatureResponse
+    outdoor_light: OutdoorLightResponse
+    home_control_mode: HomeControlModeResponse
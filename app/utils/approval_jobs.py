@@ -0,0 +1,306 @@
+"""
+Пакетное одобрение заявок в фоне.
+
+Задание и его позиции хранятся в таблицах approval_jobs и
+approval_job_items. Ограниченный пул потоков разбирает позиции:
+каждая позиция забирается атомарным UPDATE ... WHERE status = 'pending',
+поэтому несколько потоков (и процессов сервера) могут обрабатывать одно
+задание без повторов. Каждая заявка одобряется в своей транзакции,
+ошибка одной заявки не останавливает остальные.
+"""
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app import models
+from app.auth import invalidate_user
+from app.database import SessionLocal
+from app.utils.approvals import set_application_status
+
+APPROVAL_WORKERS = int(os.getenv("APPROVAL_WORKERS", "2"))
+# Позиция в статусе running дольше этого времени считается брошенной
+# (процесс упал посреди обработки) и возвращается в очередь
+APPROVAL_ITEM_TIMEOUT = float(os.getenv("APPROVAL_ITEM_TIMEOUT", "600"))
+# Как часто каждый воркер ищет такие позиции
+APPROVAL_SWEEP_INTERVAL = float(os.getenv("APPROVAL_SWEEP_INTERVAL", "60"))
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=max(APPROVAL_WORKERS, 1),
+                thread_name_prefix="approval"
+            )
+        return _pool
+
+
+def job_to_dict(job: models.ApprovalJob) -> dict:
+    """Задание в формате ApprovalJobResponse"""
+    return {
+        "id": job.id,
+        "status": job.status,
+        "total": job.total,
+        "processed": job.succeeded + job.failed,
+        "succeeded": job.succeeded,
+        "failed": job.failed,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "items": [
+            {
+                "application_id": item.application_id,
+                "status": item.status,
+                "error": item.error,
+                "finished_at": item.finished_at,
+            }
+            for item in job.items
+        ],
+    }
+
+
+def create_job(db: Session, created_by: int, application_ids: List[int]) -> models.ApprovalJob:
+    """Сохраняет задание; повторяющиеся id заявок учитываются один раз"""
+    application_ids = list(dict.fromkeys(application_ids))
+
+    job = models.ApprovalJob(created_by=created_by, total=len(application_ids))
+    job.items = [
+        models.ApprovalJobItem(application_id=application_id)
+        for application_id in application_ids
+    ]
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def submit_job(job_id: int):
+    """Ставит задание в пул: каждый поток забирает позиции, пока они есть"""
+    pool = _get_pool()
+    for _ in range(max(APPROVAL_WORKERS, 1)):
+        pool.submit(_drain_job, job_id)
+
+
+def _claim_item(db: Session, job_id: int) -> Optional[int]:
+    while True:
+        item_id = db.query(models.ApprovalJobItem.id).filter(
+            models.ApprovalJobItem.job_id == job_id,
+            models.ApprovalJobItem.status == "pending"
+        ).order_by(models.ApprovalJobItem.id).limit(1).scalar()
+
+        if item_id is None:
+            return None
+
+        claimed = db.query(models.ApprovalJobItem).filter(
+            models.ApprovalJobItem.id == item_id,
+            models.ApprovalJobItem.status == "pending"
+        ).update({
+            models.ApprovalJobItem.status: "running",
+            models.ApprovalJobItem.claimed_at: datetime.utcnow(),
+        }, synchronize_session=False)
+
+        db.query(models.ApprovalJob).filter(
+            models.ApprovalJob.id == job_id,
+            models.ApprovalJob.status == "queued"
+        ).update({models.ApprovalJob.status: "running"}, synchronize_session=False)
+        db.commit()
+
+        if claimed:
+            return item_id
+
+
+def _process_item(db: Session, item_id: int):
+    item = db.get(models.ApprovalJobItem, item_id)
+    application = db.query(models.Application).filter(
+        models.Application.id == item.application_id
+    ).with_for_update().first()
+
+    user = None
+    error = None
+    if not application:
+        error = "Application not found"
+    elif application.status != "pending":
+        error = f"Application is already {application.status}"
+    else:
+        try:
+            user = set_application_status(db, application, "approved")
+            db.flush()
+        except Exception as e:
+            db.rollback()
+            logger.exception("Approval of application %s failed", item.application_id)
+            user = None
+            error = str(e) or repr(e)
+            item = db.get(models.ApprovalJobItem, item_id)
+
+    # Результат позиции фиксируется в той же транзакции, что и одобрение
+    item.status = "failed" if error else "done"
+    item.error = error
+    item.finished_at = datetime.utcnow()
+
+    counter = models.ApprovalJob.failed if error else models.ApprovalJob.succeeded
+    db.query(models.ApprovalJob).filter(
+        models.ApprovalJob.id == item.job_id
+    ).update({counter: counter + 1}, synchronize_session=False)
+
+    if user:
+        invalidate_user(db, user.login)
+    db.commit()
+
+
+def _finish_job(db: Session, job_id: int):
+    unfinished = db.query(models.ApprovalJobItem.id).filter(
+        models.ApprovalJobItem.job_id == job_id,
+        models.ApprovalJobItem.status.in_(("pending", "running"))
+    ).first()
+
+    if unfinished is None:
+        db.query(models.ApprovalJob).filter(
+            models.ApprovalJob.id == job_id,
+            models.ApprovalJob.status != "done"
+        ).update({
+            models.ApprovalJob.status: "done",
+            models.ApprovalJob.finished_at: datetime.utcnow(),
+        }, synchronize_session=False)
+        db.commit()
+
+
+def _fail_item(db: Session, item_id: int, error: str):
+    """Позиция, обработка которой упала, фиксируется как failed"""
+    updated = db.query(models.ApprovalJobItem).filter(
+        models.ApprovalJobItem.id == item_id,
+        models.ApprovalJobItem.status == "running"
+    ).update({
+        models.ApprovalJobItem.status: "failed",
+        models.ApprovalJobItem.error: error,
+        models.ApprovalJobItem.finished_at: datetime.utcnow(),
+    }, synchronize_session=False)
+
+    if updated:
+        item = db.get(models.ApprovalJobItem, item_id)
+        db.query(models.ApprovalJob).filter(
+            models.ApprovalJob.id == item.job_id
+        ).update({models.ApprovalJob.failed: models.ApprovalJob.failed + 1}, synchronize_session=False)
+    db.commit()
+
+
+def _drain_job(job_id: int):
+    with SessionLocal() as db:
+        try:
+            while True:
+                item_id = _claim_item(db, job_id)
+                if item_id is None:
+                    break
+
+                try:
+                    _process_item(db, item_id)
+                except Exception as e:
+                    db.rollback()
+                    logger.exception("Approval job %s: item %s failed", job_id, item_id)
+                    _fail_item(db, item_id, str(e) or repr(e))
+
+            _finish_job(db, job_id)
+        except Exception:
+            # Недоступна БД: забранные позиции вернутся в очередь при следующем старте
+            db.rollback()
+            logger.exception("Approval job %s stopped", job_id)
+
+
+def requeue_stale_items(db: Session) -> List[int]:
+    """
+    Возвращает в очередь позиции, которые дольше APPROVAL_ITEM_TIMEOUT в
+    статусе running (процесс упал посреди обработки). Возвращает id их заданий.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=APPROVAL_ITEM_TIMEOUT)
+    stale = db.query(models.ApprovalJobItem).filter(
+        models.ApprovalJobItem.status == "running",
+        models.ApprovalJobItem.claimed_at < stale_before
+    )
+
+    job_ids = [job_id for (job_id,) in stale.with_entities(models.ApprovalJobItem.job_id).distinct().all()]
+    if job_ids:
+        stale.update({models.ApprovalJobItem.status: "pending"}, synchronize_session=False)
+    db.commit()
+    return job_ids
+
+
+def resume_jobs() -> int:
+    """Возвращает в очередь брошенные позиции и запускает незавершённые задания"""
+    with SessionLocal() as db:
+        requeue_stale_items(db)
+
+        job_ids = [
+            job_id for (job_id,) in db.query(models.ApprovalJob.id).filter(
+                models.ApprovalJob.status != "done"
+            ).all()
+        ]
+
+    for job_id in job_ids:
+        submit_job(job_id)
+    return len(job_ids)
+
+
+def sweep_stale_items() -> int:
+    """Периодическая проверка: брошенные позиции снова ставятся в пул"""
+    with SessionLocal() as db:
+        job_ids = requeue_stale_items(db)
+
+    for job_id in job_ids:
+        logger.warning("Approval job %s: requeued stale items", job_id)
+        submit_job(job_id)
+    return len(job_ids)
+
+
+async def _sweep():
+    while True:
+        await asyncio.sleep(APPROVAL_SWEEP_INTERVAL)
+        try:
+            await run_in_threadpool(sweep_stale_items)
+        except Exception:
+            logger.exception("Approval sweep failed")
+
+
+_sweeper_task: Optional[asyncio.Task] = None
+
+
+def start_sweeper():
+    """
+    Позиции, брошенные упавшим воркером, возвращаются в очередь не только
+    при старте: воркер мог перезапуститься раньше APPROVAL_ITEM_TIMEOUT
+    """
+    global _sweeper_task
+    if _sweeper_task is None:
+        _sweeper_task = asyncio.create_task(_sweep())
+
+
+async def stop_sweeper():
+    global _sweeper_task
+
+    if _sweeper_task is None:
+        return
+    _sweeper_task.cancel()
+    try:
+        await _sweeper_task
+    except asyncio.CancelledError:
+        pass
+    _sweeper_task = None
+
+
+def shutdown_workers():
+    """Дожидается текущих позиций; не начатые останутся pending до следующего старта"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,55 @@
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.utils.sensor_utils import process_application_rooms
+from app.utils.user_stats import add_user_rooms, change_application_status
+
+
+def set_application_status(
+        db: Session,
+        application: models.Application,
+        new_status: str,
+        rejection_comment: Optional[str] = None
+) -> Optional[models.User]:
+    """
+    Меняет статус заявки; при одобрении создаёт комнаты и датчики.
+    Коммит остаётся за вызывающим кодом. Возвращает пользователя
+    одобренной заявки (его кэш нужно сбросить после коммита).
+    """
+    old_status = application.status
+    application.status = new_status
+    application.rejection_comment = rejection_comment if new_status == "rejected" else None
+    change_application_status(db, application.user_id, old_status, application.status)
+
+    if new_status != "approved":
+        return None
+
+    # ОДОБРЕНИЕ: application_submitted = true
+    user = db.query(models.User).filter(
+        models.User.id == application.user_id
+    ).first()
+
+    if not user:
+        raise Exception("User not found")
+
+    user.application_submitted = True
+
+    if not application.rooms_config:
+        raise Exception("Application has no rooms_config")
+
+    created_room_ids = process_application_rooms(
+        db=db,
+        user_id=application.user_id,
+        rooms_config=application.rooms_config
+    )
+
+    application.created_room_ids = created_room_ids
+    add_user_rooms(
+        db,
+        application.user_id,
+        rooms=len(created_room_ids),
+        sensors=sum(len(rc.get("sensor_ids", [])) for rc in application.rooms_config)
+    )
+    return user
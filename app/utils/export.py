@@ -0,0 +1,91 @@
+"""
+Потоковая выгрузка больших таблиц в CSV и NDJSON.
+
+Строки читаются серверным курсором (yield_per) и отдаются клиенту
+пачками по мере чтения, поэтому память не зависит от объёма выгрузки.
+Генератор открывает собственную сессию: сессия запроса закрывается
+раньше, чем ответ будет дочитан.
+"""
+import csv
+import io
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, Sequence
+
+from fastapi.responses import StreamingResponse
+from pydantic_core import to_json
+from sqlalchemy import Select
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return ";".join(str(item) for item in value)
+    return value
+
+
+def _stream(
+        build_query: Callable[[Session], Select],
+        to_rows: Callable[[Any], Iterable[Dict[str, Any]]],
+        columns: Sequence[str],
+        export_format: str
+) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == "csv":
+        # BOM - чтобы Excel открыл кириллицу без выбора кодировки
+        buffer.write("\ufeff")
+        writer.writerow(columns)
+
+    with SessionLocal() as db:
+        statement = build_query(db).execution_options(yield_per=EXPORT_CHUNK_SIZE)
+
+        pending = 0
+        for record in db.execute(statement):
+            for row in to_rows(record):
+                if export_format == "csv":
+                    writer.writerow([_csv_value(row.get(column)) for column in columns])
+                else:
+                    buffer.write(to_json(row).decode())
+                    buffer.write("\n")
+                pending += 1
+
+            if pending >= EXPORT_CHUNK_SIZE:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def streaming_export(
+        build_query: Callable[[Session], Select],
+        to_rows: Callable[[Any], Iterable[Dict[str, Any]]],
+        columns: Sequence[str],
+        export_format: str,
+        filename: str
+) -> StreamingResponse:
+    """
+    build_query строит select() в сессии выгрузки, to_rows превращает
+    запись запроса в одну или несколько строк выгрузки (dict по columns).
+    """
+    return StreamingResponse(
+        _stream(build_query, to_rows, columns, export_format),
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'}
+    )
@@ -0,0 +1,237 @@
+"""
+Шина инвалидации кэшей между воркерами.
+
+Кэши живут в памяти процесса (пользователи, текущие значения датчиков),
+поэтому при нескольких воркерах запись в одном из них должна сбросить
+или обновить кэш во всех остальных.
+
+Пути записи вызывают notify(db, kind, value) до commit: сообщения
+копятся в сессии и при commit уходят в Postgres через pg_notify в той
+же транзакции - другие воркеры получают их только если запись
+зафиксирована. После commit сообщения применяются и в своём процессе.
+Каждый воркер слушает канал (LISTEN) фоновой задачей и вызывает
+обработчики, зарегистрированные через register_handler.
+
+Если соединение слушателя рвалось, часть сообщений могла потеряться:
+после переподключения кэши целиком сбрасываются (register_reset).
+На SQLite (один процесс) сообщения только применяются локально.
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+INVALIDATION_CHANNEL = os.getenv("INVALIDATION_CHANNEL", "cache_invalidation")
+INVALIDATION_PING_INTERVAL = float(os.getenv("INVALIDATION_PING_INTERVAL", "30"))
+INVALIDATION_RETRY_MAX_DELAY = float(os.getenv("INVALIDATION_RETRY_MAX_DELAY", "30"))
+INVALIDATION_CONNECT_TIMEOUT = float(os.getenv("INVALIDATION_CONNECT_TIMEOUT", "5"))
+
+# Ограничение Postgres на payload NOTIFY - 8000 байт
+MAX_PAYLOAD_BYTES = 7900
+
+# Сообщения своего процесса приходят и через LISTEN - их пропускаем
+ORIGIN = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+_PENDING_KEY = "invalidations"
+_RESET = "reset"
+
+logger = logging.getLogger(__name__)
+
+_handlers: Dict[str, Callable[[Any], None]] = {}
+_resets: List[Callable[[], None]] = []
+
+stats = {
+    "published": 0,
+    "received": 0,
+    "reconnects": 0,
+    "resets": 0,
+}
+
+
+def register_handler(kind: str):
+    """Декоратор: обработчик сообщений вида kind, получает value"""
+    def decorator(handler: Callable[[Any], None]):
+        _handlers[kind] = handler
+        return handler
+    return decorator
+
+
+def register_reset(reset: Callable[[], None]):
+    """Полный сброс кэша, когда сообщения могли быть потеряны"""
+    _resets.append(reset)
+    return reset
+
+
+def notify(db: Session, kind: str, value: Any):
+    """Инвалидация, которая будет разослана при commit сессии db"""
+    db.info.setdefault(_PENDING_KEY, []).append([kind, value])
+
+
+def _apply(messages: List[list]):
+    for kind, value in messages:
+        if kind == _RESET:
+            reset_all()
+            continue
+        handler = _handlers.get(kind)
+        if handler is None:
+            logger.warning("No invalidation handler for %r", kind)
+            continue
+        try:
+            handler(value)
+        except Exception:
+            logger.exception("Invalidation handler %r failed", kind)
+
+
+def reset_all():
+    stats["resets"] += 1
+    for reset in _resets:
+        reset()
+
+
+def _payloads(messages: List[list]) -> List[str]:
+    """Сообщения, упакованные в payload не длиннее MAX_PAYLOAD_BYTES"""
+    payloads = []
+    batch = []
+    size = 0
+    overhead = len(json.dumps({"o": ORIGIN, "m": []}))
+
+    for message in messages:
+        encoded = json.dumps(message, separators=(",", ":"))
+        if overhead + len(encoded.encode()) > MAX_PAYLOAD_BYTES:
+            # Не помещается даже одно сообщение - воркеры сбросят кэши целиком
+            logger.warning("Invalidation %r is too large, sending reset", message[0])
+            message = [_RESET, None]
+            encoded = json.dumps(message)
+
+        if batch and overhead + size + len(encoded.encode()) + 1 > MAX_PAYLOAD_BYTES:
+            payloads.append(json.dumps({"o": ORIGIN, "m": batch}, separators=(",", ":")))
+            batch = []
+            size = 0
+        batch.append(message)
+        size += len(encoded.encode()) + 1
+
+    if batch:
+        payloads.append(json.dumps({"o": ORIGIN, "m": batch}, separators=(",", ":")))
+    return payloads
+
+
+@event.listens_for(Session, "before_commit")
+def _send_pending(session: Session):
+    messages = session.info.get(_PENDING_KEY)
+    if not messages:
+        return
+
+    connection = session.connection()
+    if connection.dialect.name != "postgresql":
+        return
+
+    for payload in _payloads(messages):
+        connection.execute(select(func.pg_notify(INVALIDATION_CHANNEL, payload)))
+        stats["published"] += 1
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session: Session):
+    messages = session.info.pop(_PENDING_KEY, None)
+    if messages:
+        _apply(messages)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+# ---------- Слушатель ----------
+def _on_notification(connection, pid, channel, payload):
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        logger.warning("Malformed invalidation payload: %.100s", payload)
+        return
+
+    if data.get("o") == ORIGIN:
+        return
+    stats["received"] += 1
+    _apply(data.get("m", []))
+
+
+async def _listen(dsn: str, listening: asyncio.Event):
+    import asyncpg
+
+    delay = 0.5
+
+    while True:
+        try:
+            connection = await asyncpg.connect(dsn)
+        except (OSError, asyncpg.PostgresError) as e:
+            logger.warning("Invalidation listener cannot connect: %s, retrying in %.1fs", e, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, INVALIDATION_RETRY_MAX_DELAY)
+            continue
+
+        closed = asyncio.Event()
+        connection.add_termination_listener(lambda _: closed.set())
+        try:
+            await connection.add_listener(INVALIDATION_CHANNEL, _on_notification)
+            if listening.is_set():
+                # Пока слушателя не было, сообщения могли потеряться
+                stats["reconnects"] += 1
+                reset_all()
+            listening.set()
+            delay = 0.5
+
+            while not closed.is_set():
+                try:
+                    await asyncio.wait_for(closed.wait(), timeout=INVALIDATION_PING_INTERVAL)
+                except asyncio.TimeoutError:
+                    # Обрыв соединения без закрытия сокета виден только по запросу
+                    await connection.execute("SELECT 1")
+        except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+            logger.warning("Invalidation listener lost connection: %s", e)
+        finally:
+            if not connection.is_closed():
+                connection.terminate()
+
+
+_listener_task: Optional[asyncio.Task] = None
+
+
+async def start_listener(engine: Engine):
+    """
+    Запускает фоновый LISTEN, если основная БД - Postgres, и ждёт
+    подключения слушателя (не дольше INVALIDATION_CONNECT_TIMEOUT)
+    """
+    global _listener_task
+
+    if engine.dialect.name != "postgresql":
+        return
+    dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+    listening = asyncio.Event()
+    _listener_task = asyncio.create_task(_listen(dsn, listening))
+
+    try:
+        await asyncio.wait_for(listening.wait(), timeout=INVALIDATION_CONNECT_TIMEOUT)
+    except asyncio.TimeoutError:
+        # Подключится позже; кэши, прогретые до этого, будут сброшены
+        logger.warning("Invalidation listener is not connected yet")
+        listening.set()
+
+
+async def stop_listener():
+    global _listener_task
+
+    if _listener_task is None:
+        return
+    _listener_task.cancel()
+    try:
+        await _listener_task
+    except asyncio.CancelledError:
+        pass
+    _listener_task = None
@@ -0,0 +1,318 @@
+"""
+Текущие значения датчиков в памяти процесса.
+
+Значения хранятся не в ORM-объектах, а в плоских массивах, где индекс -
+глобальный id датчика (таблица sensors): тип, комната, число с плавающей
+точкой, флаг вкл/выкл в битовых масках, код статуса и время создания.
+Вместе с индексом комнат это ~26 байт на датчик: миллион датчиков
+занимает порядка 26 МБ.
+
+Хранилище прогревается целиком при старте приложения, обновляется при
+приёме данных от Arduino и при переключении устройств - во всех
+воркерах через шину инвалидации (notify_sensor_updates). Комнаты,
+которых нет в памяти (созданные после прогрева или другим процессом),
+один раз дочитываются из БД.
+"""
+import math
+import threading
+from array import array
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import models
+from app.utils.invalidation import notify, register_handler, register_reset
+
+# Совместим по атрибутам с models.Sensor, поэтому подходит для
+# sensor_to_dict и user_room_info
+SensorState = namedtuple(
+    "SensorState", ["id", "room_id", "type", "value", "is_on", "status", "created_at"]
+)
+
+_EPOCH = datetime(1970, 1, 1)
+_NO_KIND = 0
+_NO_ROOM = -1
+_NO_STATUS = 0
+
+
+def _to_micros(moment: Optional[datetime]) -> int:
+    if moment is None:
+        return -1
+    return (moment - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(micros: int) -> Optional[datetime]:
+    if micros < 0:
+        return None
+    return _EPOCH + timedelta(microseconds=micros)
+
+
+class LiveSensorState:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        # Колонки, индекс - id датчика
+        self._kinds = array("b")       # код типа из models.SENSOR_KINDS, 0 - датчика нет
+        self._room_ids = array("i")
+        self._values = array("d")      # NaN - значения нет
+        self._created = array("q")     # микросекунды от эпохи
+        self._statuses = array("B")    # индекс в self._status_names
+        self._is_on = bytearray()      # бит на датчик
+        self._has_state = bytearray()  # бит установлен, если is_on не None
+
+        self._status_names = [None]
+        self._status_codes = {None: _NO_STATUS}
+
+        # Какие датчики в какой комнате
+        self._rooms: Dict[int, array] = {}
+
+    # ---------- Внутреннее ----------
+    def _ensure_capacity(self, sensor_id: int):
+        size = len(self._kinds)
+        if sensor_id < size:
+            return
+
+        grow = max(sensor_id + 1, size * 2, 1024) - size
+        self._kinds.extend(array("b", [_NO_KIND]) * grow)
+        self._room_ids.extend(array("i", [_NO_ROOM]) * grow)
+        self._values.extend(array("d", [math.nan]) * grow)
+        self._created.extend(array("q", [-1]) * grow)
+        self._statuses.extend(array("B", [_NO_STATUS]) * grow)
+
+        bits = (len(self._kinds) + 7) // 8 - len(self._is_on)
+        self._is_on.extend(bytes(bits))
+        self._has_state.extend(bytes(bits))
+
+    def _status_code(self, status: Optional[str]) -> int:
+        code = self._status_codes.get(status)
+        if code is None:
+            code = len(self._status_names)
+            self._status_names.append(status)
+            self._status_codes[status] = code
+        return code
+
+    @staticmethod
+    def _set_bit(bits: bytearray, sensor_id: int, flag: bool):
+        if flag:
+            bits[sensor_id >> 3] |= 1 << (sensor_id & 7)
+        else:
+            bits[sensor_id >> 3] &= ~(1 << (sensor_id & 7)) & 0xFF
+
+    @staticmethod
+    def _get_bit(bits: bytearray, sensor_id: int) -> bool:
+        return bool(bits[sensor_id >> 3] & (1 << (sensor_id & 7)))
+
+    def _set_is_on(self, sensor_id: int, is_on: Optional[bool]):
+        self._set_bit(self._has_state, sensor_id, is_on is not None)
+        self._set_bit(self._is_on, sensor_id, bool(is_on))
+
+    def _read(self, sensor_id: int) -> Optional[SensorState]:
+        if sensor_id < 0 or sensor_id >= len(self._kinds) or self._kinds[sensor_id] == _NO_KIND:
+            return None
+
+        value = self._values[sensor_id]
+        return SensorState(
+            id=sensor_id,
+            room_id=self._room_ids[sensor_id],
+            type=models.SENSOR_KINDS[self._kinds[sensor_id]],
+            value=None if math.isnan(value) else value,
+            is_on=self._get_bit(self._is_on, sensor_id) if self._get_bit(self._has_state, sensor_id) else None,
+            status=self._status_names[self._statuses[sensor_id]],
+            created_at=_from_micros(self._created[sensor_id]),
+        )
+
+    def _store(self, sensor_id, room_id, kind, value, is_on, status, created_at):
+        self._ensure_capacity(sensor_id)
+        self._kinds[sensor_id] = models.SENSOR_KIND_IDS[kind]
+        self._room_ids[sensor_id] = room_id
+        self._values[sensor_id] = math.nan if value is None else value
+        self._created[sensor_id] = _to_micros(created_at)
+        self._statuses[sensor_id] = self._status_code(status)
+        self._set_is_on(sensor_id, is_on)
+
+    # ---------- Запись ----------
+    def load_rooms(self, rows: Iterable, room_ids: Iterable[int] = ()):
+        """
+        Загружает датчики (строки с атрибутами как у models.Sensor).
+        room_ids - комнаты, которые нужно считать загруженными, даже если
+        датчиков в них нет.
+        """
+        with self._lock:
+            for room_id in room_ids:
+                self._rooms.setdefault(room_id, array("i"))
+
+            for row in rows:
+                if row.room_id not in self._rooms:
+                    self._rooms[row.room_id] = array("i")
+                if not (row.id < len(self._kinds) and self._kinds[row.id] != _NO_KIND):
+                    self._rooms[row.room_id].append(row.id)
+                self._store(row.id, row.room_id, row.type, row.value, row.is_on, row.status, row.created_at)
+
+    def update(self, sensor_id: int, **columns):
+        """Новые значения колонок value / is_on / status известного датчика"""
+        with self._lock:
+            if sensor_id >= len(self._kinds) or self._kinds[sensor_id] == _NO_KIND:
+                return
+
+            if "value" in columns:
+                value = columns["value"]
+                self._values[sensor_id] = math.nan if value is None else value
+            if "is_on" in columns:
+                self._set_is_on(sensor_id, columns["is_on"])
+            if "status" in columns:
+                self._statuses[sensor_id] = self._status_code(columns["status"])
+
+    def forget_room(self, room_id: int):
+        """Комната будет дочитана из БД при следующем обращении"""
+        with self._lock:
+            sensor_ids = self._rooms.pop(room_id, ())
+            for sensor_id in sensor_ids:
+                self._kinds[sensor_id] = _NO_KIND
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def warm(self, db: Session, batch_size: int = 10000):
+        """Полная загрузка всех датчиков потоком строк, без ORM-объектов"""
+        rows = db.query(
+            models.Sensor.id,
+            models.Sensor.room_id,
+            models.Sensor.type,
+            models.Sensor.value,
+            models.Sensor.is_on,
+            models.Sensor.status,
+            models.Sensor.created_at,
+        ).order_by(models.Sensor.id).yield_per(batch_size)
+
+        room_ids = [room_id for (room_id,) in db.query(models.Room.id)]
+
+        with self._lock:
+            self.clear()
+            self.load_rooms(rows, room_ids)
+
+    # ---------- Чтение ----------
+    def get(self, sensor_id: int) -> Optional[SensorState]:
+        with self._lock:
+            return self._read(sensor_id)
+
+    def room_sensors(self, room_id: int) -> Optional[List[SensorState]]:
+        """Датчики комнаты по возрастанию id или None, если комнаты нет в памяти"""
+        with self._lock:
+            sensor_ids = self._rooms.get(room_id)
+            if sensor_ids is None:
+                return None
+            return [self._read(sensor_id) for sensor_id in sensor_ids]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sensors": len(self._kinds) - self._kinds.count(_NO_KIND),
+                "rooms": len(self._rooms),
+                "capacity": len(self._kinds),
+                "bytes": (
+                    self._kinds.itemsize * len(self._kinds)
+                    + self._room_ids.itemsize * len(self._room_ids)
+                    + self._values.itemsize * len(self._values)
+                    + self._created.itemsize * len(self._created)
+                    + self._statuses.itemsize * len(self._statuses)
+                    + len(self._is_on) + len(self._has_state)
+                    + sum(ids.itemsize * len(ids) for ids in self._rooms.values())
+                ),
+            }
+
+
+live_state = LiveSensorState()
+
+
+def notify_sensor_updates(db, updates: List[tuple]):
+    """
+    Новые значения датчиков [(sensor_id, {колонка: значение})] попадут
+    в память всех воркеров после commit сессии db
+    """
+    notify(db, "sensors", [[sensor_id, columns] for sensor_id, columns in updates])
+
+
+@register_handler("sensors")
+def _apply_sensor_updates(updates: List[list]):
+    for sensor_id, columns in updates:
+        live_state.update(sensor_id, **columns)
+
+
+# Пропущенные обновления: комнаты будут дочитаны из БД заново
+register_reset(live_state.clear)
+
+
+def _split_known(room_ids: List[int]):
+    """Датчики комнат, уже загруженных в память, и список остальных комнат"""
+    result = {}
+    missing = []
+    for room_id in room_ids:
+        sensors = live_state.room_sensors(room_id)
+        if sensors is None:
+            missing.append(room_id)
+        else:
+            result[room_id] = sensors
+    return result, missing
+
+
+def _remember_rooms(result: dict, rows, missing: List[int]) -> dict:
+    live_state.load_rooms(rows, missing)
+    for room_id in missing:
+        result[room_id] = live_state.room_sensors(room_id) or []
+    return result
+
+
+def _room_sensors_query(room_ids: List[int]):
+    return select(models.Sensor).where(
+        models.Sensor.room_id.in_(room_ids)
+    ).order_by(models.Sensor.id)
+
+
+def get_rooms_sensors(db: Session, room_ids: List[int]) -> Dict[int, List[SensorState]]:
+    """
+    Датчики нескольких комнат: из памяти, а отсутствующие там комнаты
+    дочитываются из БД одним запросом и запоминаются.
+    """
+    result, missing = _split_known(room_ids)
+    if missing:
+        rows = db.scalars(_room_sensors_query(missing)).all()
+        _remember_rooms(result, rows, missing)
+    return result
+
+
+async def get_rooms_sensors_async(db: AsyncSession, room_ids: List[int]) -> Dict[int, List[SensorState]]:
+    """get_rooms_sensors для асинхронной сессии"""
+    result, missing = _split_known(room_ids)
+    if missing:
+        rows = (await db.scalars(_room_sensors_query(missing))).all()
+        _remember_rooms(result, rows, missing)
+    return result
+
+
+def get_room_sensors(db: Session, room_id: int) -> List[SensorState]:
+    return get_rooms_sensors(db, [room_id])[room_id]
+
+
+async def get_room_sensors_async(db: AsyncSession, room_id: int) -> List[SensorState]:
+    return (await get_rooms_sensors_async(db, [room_id]))[room_id]
+
+
+def get_sensor(db: Session, sensor_id: int) -> Optional[SensorState]:
+    """Датчик по id: из памяти, иначе дочитывается вся его комната"""
+    sensor = live_state.get(sensor_id)
+    if sensor is not None:
+        return sensor
+
+    room_id = db.query(models.Sensor.room_id).filter(models.Sensor.id == sensor_id).scalar()
+    if room_id is None:
+        return None
+
+    get_room_sensors(db, room_id)
+    return live_state.get(sensor_id)
@@ -0,0 +1,144 @@
+import bisect
+import threading
+from typing import Sequence
+
+# Границы корзин в секундах: от миллисекунды до 10 секунд
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Потокобезопасная гистограмма с фиксированными корзинами (как в Prometheus)"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # последняя корзина - +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> dict:
+        """Накопленные счётчики по корзинам: {"le": {граница: count}, "sum", "count"}"""
+        with self._lock:
+            counts = list(self._counts)
+            total_sum = self._sum
+            total_count = self._count
+
+        cumulative = {}
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            cumulative["+Inf" if bound == float("inf") else str(bound)] = running
+
+        return {"le": cumulative, "sum": total_sum, "count": total_count}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def render_histogram(name: str, histogram: Histogram, **labels) -> list:
+    """Строки гистограммы в текстовом формате Prometheus (без # TYPE)"""
+    snapshot = histogram.snapshot()
+    lines = [
+        f"{name}_bucket{_labels(**labels, le=bound)} {count}"
+        for bound, count in snapshot["le"].items()
+    ]
+    lines.append(f"{name}_sum{_labels(**labels)} {snapshot['sum']}")
+    lines.append(f"{name}_count{_labels(**labels)} {snapshot['count']}")
+    return lines
+
+
+def render_value(name: str, value, **labels) -> str:
+    return f"{name}{_labels(**labels)} {value}"
+
+
+def render_type(name: str, kind: str) -> str:
+    """Строка # TYPE перед всеми строками одной метрики (gauge, counter, histogram)"""
+    return f"# TYPE {name} {kind}"
+
+
+class RequestMetrics:
+    """
+    Метрики HTTP-запросов по маршрутам: гистограмма длительности,
+    счётчик ответов по статусам, число и время SQL-запросов, число
+    запросов с повторяющимися SQL (N+1), а также запросов в обработке.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self._latency = {}      # (method, route) -> Histogram
+        self._responses = {}    # (method, route, status) -> count
+        self._db_statements = {}  # (method, route) -> count
+        self._db_seconds = {}   # (method, route) -> seconds
+        self._repeated = {}     # (method, route) -> запросов с признаками N+1
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, method: str, route: str, status: int, seconds: float,
+                 db_statements: int, db_seconds: float, repeated: bool = False):
+        key = (method, route)
+        with self._lock:
+            self.in_flight -= 1
+            histogram = self._latency.get(key)
+            if histogram is None:
+                histogram = self._latency[key] = Histogram()
+            self._responses[key + (status,)] = self._responses.get(key + (status,), 0) + 1
+            self._db_statements[key] = self._db_statements.get(key, 0) + db_statements
+            self._db_seconds[key] = self._db_seconds.get(key, 0.0) + db_seconds
+            if repeated:
+                self._repeated[key] = self._repeated.get(key, 0) + 1
+        histogram.observe(seconds)
+
+    def render(self) -> list:
+        with self._lock:
+            in_flight = self.in_flight
+            latency = dict(self._latency)
+            responses = dict(self._responses)
+            db_statements = dict(self._db_statements)
+            db_seconds = dict(self._db_seconds)
+            repeated = dict(self._repeated)
+
+        lines = [
+            "# TYPE http_requests_in_flight gauge",
+            render_value("http_requests_in_flight", in_flight),
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in sorted(latency.items()):
+            lines += render_histogram("http_request_duration_seconds", histogram, method=method, route=route)
+
+        lines.append("# TYPE http_responses_total counter")
+        for (method, route, status), count in sorted(responses.items()):
+            lines.append(render_value("http_responses_total", count, method=method, route=route, status=status))
+
+        lines.append("# TYPE http_db_statements_total counter")
+        for (method, route), count in sorted(db_statements.items()):
+            lines.append(render_value("http_db_statements_total", count, method=method, route=route))
+
+        lines.append("# TYPE http_db_seconds_total counter")
+        for (method, route), seconds in sorted(db_seconds.items()):
+            lines.append(render_value("http_db_seconds_total", seconds, method=method, route=route))
+
+        lines.append("# TYPE http_repeated_statements_requests_total counter")
+        for (method, route), count in sorted(repeated.items()):
+            lines.append(render_value("http_repeated_statements_requests_total", count, method=method, route=route))
+
+        return lines
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,67 @@
+import base64
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Заголовок, в котором возвращается курсор следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Непрозрачный курсор на позицию (created_at, id)"""
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def keyset_page(
+        query: Query,
+        created_column,
+        id_column,
+        cursor: Optional[str],
+        limit: int,
+        key: Callable[[Any], Tuple[datetime, int]],
+        descending: bool = True
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Страница по ключу (created_at, id): вместо OFFSET условие на позицию
+    последней строки предыдущей страницы, поэтому каждая страница - это
+    короткий проход по индексу. Возвращает строки и курсор следующей
+    страницы (None, если страница последняя).
+    """
+    position = tuple_(created_column, id_column)
+
+    if cursor:
+        after = tuple_(*decode_cursor(cursor))
+        query = query.filter(position < after if descending else position > after)
+
+    if descending:
+        query = query.order_by(created_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(created_column.asc(), id_column.asc())
+
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*key(rows[-1]))
+
+    return rows, next_cursor
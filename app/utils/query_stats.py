@@ -0,0 +1,136 @@
+"""
+Учёт SQL-запросов по событиям SQLAlchemy.
+
+Каждый выполненный запрос добавляется в счётчик текущего HTTP-запроса
+(contextvar, его выставляет middleware в app/main.py) и в общую
+гистограмму времени выполнения запросов. Запросы одной формы, которые
+повторяются в рамках HTTP-запроса N_PLUS_ONE_THRESHOLD раз и больше,
+middleware считает признаком N+1 и пишет в лог.
+"""
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.utils.metrics import Histogram
+
+
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+# Заголовок X-Query-Count с числом SQL-запросов - для отладки, по умолчанию выключен
+QUERY_COUNT_HEADER = os.getenv("QUERY_COUNT_HEADER", "false").lower() in ("1", "true", "yes")
+
+# Списки плейсхолдеров в скобках (IN (?, ?, ?), VALUES (...)) сворачиваются,
+# чтобы запросы с разным числом параметров считались одной формой
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|\$\d+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|\$\d+))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    return _PLACEHOLDER_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class QueryStats:
+    """Число, суммарное время и формы SQL-запросов в рамках одного HTTP-запроса"""
+
+    __slots__ = ("count", "seconds", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Dict[str, int] = {}
+
+    def add(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        shape = statement_shape(statement)
+        self.shapes[shape] = self.shapes.get(shape, 0) + 1
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        """Формы запросов, выполненные threshold раз и больше"""
+        return sorted(
+            ((shape, count) for shape, count in self.shapes.items() if count >= threshold),
+            key=lambda item: -item[1]
+        )
+
+
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+# Время выполнения всех запросов процесса
+statement_seconds = Histogram()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started
+    statement_seconds.observe(elapsed)
+
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.add(statement, elapsed)
+
+    if _budgets:
+        for budget in list(_budgets):
+            budget.stats.add(statement, elapsed)
+
+
+def install_query_hooks(engine: Engine):
+    """Подключает учёт запросов к движку (для AsyncEngine - к его sync_engine)"""
+    if event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+_budgets: List["QueryBudget"] = []
+_budgets_lock = threading.Lock()
+
+
+class QueryBudget:
+    """
+    Проверка числа SQL-запросов для тестов:
+
+        with QueryBudget(max_queries=3):
+            client.get("/rooms/user/rooms", headers=headers)
+
+    Считаются все запросы к движкам с install_query_hooks, выполненные
+    внутри блока в любом потоке (TestClient обрабатывает запрос в своём).
+    При превышении бюджета или повторе одной формы запроса max_repeats
+    раз и больше выбрасывается AssertionError со списком запросов.
+    """
+
+    def __init__(self, max_queries: int, max_repeats: Optional[int] = N_PLUS_ONE_THRESHOLD):
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+        self.stats = QueryStats()
+
+    def __enter__(self) -> "QueryBudget":
+        with _budgets_lock:
+            _budgets.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with _budgets_lock:
+            _budgets.remove(self)
+
+        if exc_type is not None:
+            return False
+
+        problems = []
+        if self.stats.count > self.max_queries:
+            problems.append(f"{self.stats.count} queries, budget is {self.max_queries}")
+        if self.max_repeats is not None:
+            for shape, count in self.stats.repeated(self.max_repeats):
+                problems.append(f"repeated {count} times (possible N+1): {shape}")
+
+        if problems:
+            statements = "\n".join(f"  {count} x {shape}" for shape, count in self.stats.shapes.items())
+            raise AssertionError("; ".join(problems) + "\nStatements:\n" + statements)
+        return False
@@ -0,0 +1,95 @@
+"""
+Выбор между основной БД и репликой для чтения.
+
+GET-эндпоинты, подключённые через get_read_db, читают с реплики, кроме
+случаев, когда нужна основная база:
+- клиент недавно что-то записал (read-your-writes): реплика могла ещё
+  не догнать его изменение. Окно задаётся READ_YOUR_WRITES_WINDOW;
+- клиент прислал заголовок X-Read-Primary: 1;
+- реплика недавно была недоступна (REPLICA_RETRY_AFTER секунд).
+
+Недавняя запись отмечается двумя способами:
+- cookie read_primary_until в ответе на запись (время окончания окна).
+  Клиент возвращает её с запросами в любой воркер и на любой хост, в
+  том числе после регистрации и смены токена;
+- в памяти процесса по заголовку Authorization (или IP) - для клиентов
+  без cookie, но только в том воркере, который принял запись.
+
+Ограничение: клиент, который не хранит cookie (скрипты, Arduino, fetch
+без credentials: "include"), при нескольких воркерах может прочитать
+с реплики устаревшие данные. Такому клиенту нужно после записи
+присылать X-Read-Primary: 1 в течение окна. Окно по cookie считается
+по часам серверов, поэтому их время должно быть синхронизировано.
+"""
+import hashlib
+import math
+import os
+import time
+from typing import Optional
+
+from fastapi import Request, Response
+
+from app.utils.cache import TTLCache
+
+READ_YOUR_WRITES_WINDOW = float(os.getenv("READ_YOUR_WRITES_WINDOW", "5"))
+REPLICA_RETRY_AFTER = float(os.getenv("REPLICA_RETRY_AFTER", "30"))
+READ_PRIMARY_HEADER = "X-Read-Primary"
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+READ_METHODS = ("GET", "HEAD")
+
+_recent_writers = TTLCache(maxsize=100000, ttl=READ_YOUR_WRITES_WINDOW)
+_replica_down_until = 0.0
+
+
+def _client_key(request: Request) -> Optional[bytes]:
+    authorization = request.headers.get("authorization")
+    if authorization:
+        return hashlib.sha256(authorization.encode()).digest()
+    if request.client:
+        return request.client.host.encode()
+    return None
+
+
+def remember_write(request: Request, response: Response):
+    """Вызывается после успешного изменяющего запроса"""
+    key = _client_key(request)
+    if key is not None:
+        _recent_writers.set(key, True)
+
+    response.set_cookie(
+        READ_PRIMARY_COOKIE,
+        str(int(time.time() + READ_YOUR_WRITES_WINDOW)),
+        max_age=math.ceil(READ_YOUR_WRITES_WINDOW),
+        httponly=True,
+        samesite="lax"
+    )
+
+
+def _cookie_window_open(request: Request) -> bool:
+    value = request.cookies.get(READ_PRIMARY_COOKIE)
+    if not value:
+        return False
+    try:
+        return time.time() < int(value)
+    except ValueError:
+        return False
+
+
+def mark_replica_down():
+    global _replica_down_until
+    _replica_down_until = time.monotonic() + REPLICA_RETRY_AFTER
+
+
+def use_primary(request: Request) -> bool:
+    if request.method not in READ_METHODS:
+        return True
+    if request.headers.get(READ_PRIMARY_HEADER) == "1":
+        return True
+    if time.monotonic() < _replica_down_until:
+        return True
+    if _cookie_window_open(request):
+        return True
+
+    key = _client_key(request)
+    return key is not None and _recent_writers.get(key) is not None
@@ -1,53 +1,179 @@
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from app import models
-from typing import Dict, List, Any
+from app import models, schemas
+from app.utils.live_state import SensorState, get_rooms_sensors
+from typing import Dict, List, Any, Tuple
+
+# Начальные значения колонок для нового датчика каждого типа
+SENSOR_DEFAULTS = {
+    "temperature": {},
+    "light": {"is_on": False},
+    "gas": {"status": "данных нет"},
+    "humidity": {},
+    "ventilation": {"is_on": False},
+}
+
+# Статусы датчика газа по значению
+GAS_STATUSES = {
+    None: "Данных нет",
+    True: "Повышенное количество CO2",
+    False: "Газ не обнаружен",
+}
+
+
+def sensor_label(kind: str) -> str:
+    """Человекочитаемое название типа датчика"""
+    return models.SENSOR_TYPES[models.SENSOR_KIND_IDS[kind]]
+
+
+def sensor_to_dict(sensor: SensorState) -> Dict[str, Any]:
+    """Представление датчика в прежнем формате отдельной таблицы его типа"""
+    data = {
+        "id": sensor.id,
+        "room_id": sensor.room_id,
+        "created_at": sensor.created_at,
+    }
+
+    if sensor.type == "temperature":
+        data["value"] = sensor.value
+    elif sensor.type == "humidity":
+        data["humidity_level"] = sensor.value
+    elif sensor.type == "gas":
+        data["value"] = sensor.is_on
+        data["status"] = sensor.status
+    else:  # light, ventilation
+        data["is_on"] = sensor.is_on
+
+    return data
+
+
+def group_room_sensors(sensors: List[SensorState]) -> Dict[str, List[Dict[str, Any]]]:
+    """Раскладывает датчики комнаты по ключам вида temperature_sensors"""
+    grouped = {f"{kind}_sensors": [] for kind in models.SENSOR_KINDS.values()}
+    for sensor in sensors:
+        grouped[f"{sensor.type}_sensors"].append(sensor_to_dict(sensor))
+    return grouped
+
+
+def load_user_rooms(db: Session, user_id: int) -> List[Tuple[models.Room, List[SensorState]]]:
+    """
+    Комнаты из одобренной заявки пользователя вместе с их датчиками.
+    Фиксированное число запросов: заявка, комнаты и, только для комнат,
+    которых нет в памяти, датчики этих комнат.
+    """
+    approved_application = db.query(models.Application).filter(
+        models.Application.user_id == user_id,
+        models.Application.status == "approved"
+    ).first()
+
+    if not approved_application:
+        return []
+
+    # Берем ID созданных комнат из заявки
+    room_ids = approved_application.created_room_ids or []
+    if not room_ids:
+        return []
+
+    rooms_by_id = {
+        room.id: room
+        for room in db.query(models.Room).filter(models.Room.id.in_(room_ids)).all()
+    }
+
+    room_sensors = get_rooms_sensors(db, list(rooms_by_id))
+
+    return [
+        (rooms_by_id[room_id], room_sensors[room_id])
+        for room_id in room_ids
+        if room_id in rooms_by_id
+    ]
+
+
+def user_room_info(room: models.Room, sensors: List[SensorState]) -> schemas.UserRoomsResponse:
+    """Комната со списком датчиков: в порядке типов справочника, нумерация внутри типа"""
+    sensors_info = []
+    for kind in models.SENSOR_KINDS.values():
+        of_kind = [sensor for sensor in sensors if sensor.type == kind]
+        for idx, sensor in enumerate(of_kind, start=1):
+            sensors_info.append(schemas.SensorInfo(
+                id=sensor.id,
+                type=kind,
+                name=f"{sensor_label(kind)} {idx}",
+                room_id=room.id,
+                room_name=room.name
+            ))
+
+    return schemas.UserRoomsResponse(
+        id=room.id,
+        name=room.name,
+        sensors=sensors_info
+    )
+
 
 def process_application_rooms(
     db: Session,
     user_id: int,
     rooms_config: List[dict]
 ) -> List[int]:
-
-    created_room_ids = []
-
+    """
+    Создаёт комнаты и датчики одобренной заявки двумя запросами:
+    один многострочный INSERT ... RETURNING для комнат и один
+    пакетный INSERT для всех датчиков.
+    """
+    room_rows = []
     for room_config in rooms_config:
-
         room_type = room_config.get("room_type")
-        sensor_ids = room_config.get("sensor_ids", [])
 
         if not room_type:
             raise Exception(f"Invalid room config: {room_config}")
 
-        room = models.Room(
-            user_id=user_id,
-            name=room_type,
-            room_type=room_type
-        )
+        room_rows.append({
+            "user_id": user_id,
+            "name": room_type,
+            "room_type": room_type
+        })
 
-        db.add(room)
-        db.flush()
+    if not room_rows:
+        return []
 
-        created_room_ids.append(room.id)
+    # Конфигурацию проверяем целиком до вставки
+    sensor_kinds = [
+        [sensor_kind_by_id(sensor_type_id) for sensor_type_id in room_config.get("sensor_ids", [])]
+        for room_config in rooms_config
+    ]
 
-        for sensor_type_id in sensor_ids:
-            create_sensor_by_id(db, room.id, sensor_type_id)
+    created_room_ids = list(db.scalars(
+        insert(models.Room).returning(models.Room.id, sort_by_parameter_order=True),
+        room_rows
+    ))
 
-    return created_room_ids
+    sensor_rows = [
+        sensor_row(room_id, kind)
+        for room_id, kinds in zip(created_room_ids, sensor_kinds)
+        for kind in kinds
+    ]
+    if sensor_rows:
+        # render_nulls: строки разных типов идут одним пакетом, а не группами по набору колонок
+        db.execute(insert(models.Sensor).execution_options(render_nulls=True), sensor_rows)
 
-def create_sensor_by_id(db: Session, room_id: int, sensor_type_id: int):
+    return created_room_ids
 
-    sensor_map = {
-        1: models.TemperatureSensor,
-        2: models.LightSensor,
-        3: models.GasSensor,
-        4: models.HumiditySensor,
-        5: models.VentilationSensor,
-    }
 
-    model = sensor_map.get(sensor_type_id)
+def sensor_kind_by_id(sensor_type_id: int) -> str:
+    kind = models.SENSOR_KINDS.get(sensor_type_id)
 
-    if not model:
+    if not kind:
         raise Exception(f"Unknown sensor type id: {sensor_type_id}")
 
-    sensor = model(room_id=room_id)
-    db.add(sensor)
\ No newline at end of file
+    return kind
+
+
+def sensor_row(room_id: int, kind: str) -> dict:
+    """Строка нового датчика; у всех строк одинаковый набор колонок для пакетной вставки"""
+    return {
+        "room_id": room_id,
+        "type": kind,
+        "value": None,
+        "is_on": None,
+        "status": None,
+        **SENSOR_DEFAULTS[kind],
+    }
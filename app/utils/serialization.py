@@ -0,0 +1,25 @@
+from typing import Any, Dict, List, Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+# Сериализатор pydantic-core без валидации: dict -> JSON bytes за один проход
+_ROWS_ADAPTER = TypeAdapter(List[Dict[str, Any]])
+
+
+def fast_json_response(rows: List[Dict[str, Any]], headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Быстрый ответ для больших списков.
+
+    Обычный путь FastAPI валидирует возвращённые dict по response_model,
+    переводит результат в python-структуры и только затем json.dumps.
+    Здесь dict уже собраны из ORM-строк явно, поэтому они сразу
+    сериализуются в bytes. response_model у эндпоинта остаётся для
+    документации, но при возврате Response не применяется, так что
+    ключи dict должны совпадать со схемой.
+    """
+    return Response(
+        content=_ROWS_ADAPTER.dump_json(rows),
+        media_type="application/json",
+        headers=headers
+    )
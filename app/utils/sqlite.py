@@ -0,0 +1,114 @@
+"""
+Режим SQLite для установки на одном устройстве (Raspberry Pi рядом с
+Arduino), без отдельного сервера БД.
+
+- WAL: читатели не блокируют писателя и друг друга;
+- synchronous=NORMAL: в режиме WAL fsync только при checkpoint, после
+  сбоя питания теряются лишь последние транзакции, файл не портится;
+- mmap_size и cache_size: чтение горячих страниц без системных вызовов;
+- busy_timeout: ожидание блокировки вместо немедленного "database is locked".
+
+SQLite допускает одного писателя. Синхронные сессии становятся в
+очередь на WriterLock перед первой записью транзакции и освобождают
+его при commit/rollback, вместо того чтобы опрашивать занятый файл
+через busy_timeout. Асинхронный движок пишет через пул из одного
+соединения (app/utils/db_pool.py), читает - через отдельный пул.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+from app.utils.metrics import Histogram
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # < 0 - в KiB
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # мс
+
+# Операторы, которые не требуют блокировки писателя
+_READ_KEYWORDS = ("SELECT", "PRAGMA", "EXPLAIN")
+
+_HOLDS_LOCK = "sqlite_writer_lock"
+
+
+def is_sqlite_file(url) -> bool:
+    """Файловая база SQLite (для базы в памяти режим не нужен)"""
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database not in (None, "", ":memory:")
+
+
+def set_pragmas(dbapi_connection):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    finally:
+        cursor.close()
+
+
+class WriterLock:
+    """Очередь синхронных писателей к файлу SQLite"""
+
+    def __init__(self, timeout: float = SQLITE_BUSY_TIMEOUT / 1000):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.wait_time = Histogram()
+        self.timeouts = 0
+
+    def acquire(self):
+        start = time.perf_counter()
+        acquired = self._lock.acquire(timeout=self.timeout)
+        self.wait_time.observe(time.perf_counter() - start)
+        if not acquired:
+            self.timeouts += 1
+            raise TimeoutError(f"SQLite writer lock is busy for more than {self.timeout}s")
+
+    def release(self):
+        self._lock.release()
+
+    def stats(self) -> dict:
+        return {"timeouts": self.timeouts, "wait_seconds": self.wait_time.snapshot()}
+
+
+def _release(info: dict, lock: WriterLock):
+    if info.pop(_HOLDS_LOCK, False):
+        lock.release()
+
+
+def configure_engine(engine: Engine, writer_lock: WriterLock = None):
+    """Pragmas на каждом новом соединении и, для синхронного движка, очередь писателей"""
+    event.listen(engine, "connect", lambda dbapi_connection, record: set_pragmas(dbapi_connection))
+
+    if writer_lock is None:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _acquire_for_write(conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get(_HOLDS_LOCK):
+            return
+        keyword = statement.lstrip()[:7].upper()
+        if keyword.startswith(_READ_KEYWORDS):
+            return
+        writer_lock.acquire()
+        conn.info[_HOLDS_LOCK] = True
+
+    @event.listens_for(engine, "commit")
+    def _release_on_commit(conn):
+        _release(conn.info, writer_lock)
+
+    @event.listens_for(engine, "rollback")
+    def _release_on_rollback(conn):
+        _release(conn.info, writer_lock)
+
+    # Запись вне транзакции Connection (autocommit, ошибка соединения)
+    @event.listens_for(engine.pool, "checkin")
+    def _release_on_checkin(dbapi_connection, record):
+        if record is not None:
+            _release(record.info, writer_lock)
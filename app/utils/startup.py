@@ -0,0 +1,78 @@
+"""
+Старт приложения и проверки для оркестратора.
+
+Вместо фиксированной паузы перед запуском база опрашивается с
+экспоненциальной задержкой (DB_WAIT_*): приложение стартует, как только
+БД принимает соединения, и падает с ошибкой, если не дождалось.
+
+/healthz - процесс жив (без обращения к БД),
+/readyz  - старт завершён и основная БД отвечает: только тогда на
+экземпляр стоит направлять трафик.
+"""
+import logging
+import os
+import time
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+
+DB_WAIT_TIMEOUT = float(os.getenv("DB_WAIT_TIMEOUT", "60"))
+DB_WAIT_INITIAL_DELAY = float(os.getenv("DB_WAIT_INITIAL_DELAY", "0.1"))
+DB_WAIT_MAX_DELAY = float(os.getenv("DB_WAIT_MAX_DELAY", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+def ping(engine: Engine):
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+def wait_for_database(
+    engine: Engine,
+    timeout: float = DB_WAIT_TIMEOUT,
+    initial_delay: float = DB_WAIT_INITIAL_DELAY,
+    max_delay: float = DB_WAIT_MAX_DELAY
+) -> int:
+    """Ждёт, пока БД начнёт принимать соединения. Возвращает число попыток"""
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    attempt = 0
+
+    while True:
+        attempt += 1
+        try:
+            ping(engine)
+            return attempt
+        except DBAPIError as e:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(f"База данных недоступна после {attempt} попыток: {e}") from e
+            logger.info("Database is not ready (attempt %d), retrying in %.1fs", attempt, delay)
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_delay)
+
+
+class Readiness:
+    """Признак завершённого старта процесса"""
+
+    def __init__(self):
+        self.ready = False
+        self.started_at = None
+        self.startup_seconds = None
+
+    def starting(self):
+        self.ready = False
+        self.started_at = time.monotonic()
+
+    def mark_ready(self):
+        self.ready = True
+        if self.started_at is not None:
+            self.startup_seconds = time.monotonic() - self.started_at
+
+    def mark_stopping(self):
+        self.ready = False
+
+
+readiness = Readiness()
@@ -0,0 +1,86 @@
+"""
+Доступ к комнатам и датчикам одного пользователя.
+
+Комната принадлежит пользователю через rooms.user_id, датчик - через
+свою комнату. Все запросы UserScope ограничены текущим пользователем и
+идут по индексам ix_rooms_user_id_id и ix_sensors_room_id_type, так что
+затрагивают только строки этого пользователя. Чужая комната выглядит
+как несуществующая (404), а не как запрещённая: id не раскрываются.
+"""
+from typing import Optional
+
+from fastapi import Depends
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import models
+from app.auth import get_current_user, get_current_user_async
+from app.utils.live_state import SensorState, get_sensor
+
+
+class UserScope:
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+
+    # ---------- Запросы ----------
+    def rooms_query(self):
+        return select(models.Room).where(models.Room.user_id == self.user_id).order_by(models.Room.id)
+
+    def room_query(self, room_id: int):
+        return select(models.Room).where(
+            models.Room.id == room_id,
+            models.Room.user_id == self.user_id
+        )
+
+    def sensor_counts_query(self):
+        """(room_id, тип, количество) по всем комнатам пользователя"""
+        return select(
+            models.Sensor.room_id,
+            models.Sensor.type,
+            func.count(models.Sensor.id)
+        ).join(models.Room, models.Room.id == models.Sensor.room_id).where(
+            models.Room.user_id == self.user_id
+        ).group_by(models.Sensor.room_id, models.Sensor.type)
+
+    def sensor_query(self, sensor_id: int):
+        return select(models.Sensor).join(
+            models.Room, models.Room.id == models.Sensor.room_id
+        ).where(
+            models.Sensor.id == sensor_id,
+            models.Room.user_id == self.user_id
+        )
+
+    # ---------- Загрузка ----------
+    def get_rooms(self, db: Session):
+        return db.scalars(self.rooms_query()).all()
+
+    def get_room(self, db: Session, room_id: int) -> Optional[models.Room]:
+        return db.scalars(self.room_query(room_id)).first()
+
+    async def get_room_async(self, db: AsyncSession, room_id: int) -> Optional[models.Room]:
+        return (await db.scalars(self.room_query(room_id))).first()
+
+    def owns_room(self, db: Session, room_id: int) -> bool:
+        return db.scalar(select(models.Room.id).where(
+            models.Room.id == room_id,
+            models.Room.user_id == self.user_id
+        )) is not None
+
+    def get_live_sensor(self, db: Session, sensor_id: int) -> Optional[SensorState]:
+        """Текущее состояние датчика из памяти, если он в комнате пользователя"""
+        sensor = get_sensor(db, sensor_id)
+        if sensor is None or not self.owns_room(db, sensor.room_id):
+            return None
+        return sensor
+
+    def get_sensor(self, db: Session, sensor_id: int) -> Optional[models.Sensor]:
+        return db.scalars(self.sensor_query(sensor_id)).first()
+
+
+def user_scope(current_user: models.User = Depends(get_current_user)) -> UserScope:
+    return UserScope(current_user.id)
+
+
+async def user_scope_async(current_user: models.User = Depends(get_current_user_async)) -> UserScope:
+    return UserScope(current_user.id)
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class _Entry:
+    __slots__ = ("failures", "blocked_until", "strikes")
+
+    def __init__(self):
+        self.failures = deque()
+        self.blocked_until = 0.0
+        self.strikes = 0
+
+
+class SlidingWindowThrottle:
+    """
+    Ограничение неудачных попыток по ключу (логин, IP) в памяти процесса.
+
+    Если за window секунд набралось max_attempts неудач (попытка считается
+    неудачной с момента attempt), следующая попытка блокирует ключ
+    на base_delay секунд, каждая следующая блокировка вдвое дольше (не
+    больше max_delay). Счётчик блокировок сбрасывается, если новая
+    блокировка начинается позже чем через max_delay секунд после конца
+    предыдущей. Хранится не больше max_keys ключей (LRU).
+    """
+
+    def __init__(self, max_attempts: int, window: float, base_delay: float,
+                 max_delay: float, max_keys: int = 100000):
+        self.max_attempts = max_attempts
+        self.window = window
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_keys = max_keys
+
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.allowed = 0
+        self.blocked = 0
+        self.failed = 0
+
+    def attempt(self, key: str) -> float:
+        """
+        Занимает попытку до проверки пароля: она сразу считается неудачной,
+        пока не вызван succeeded/reset. Поэтому параллельные запросы к
+        одному ключу не проходят дальше max_attempts и не тратят Argon2.
+        Возвращает, сколько секунд ключ заблокирован (0 - попытка разрешена).
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+                while len(self._entries) > self.max_keys:
+                    self._entries.popitem(last=False)
+            self._entries.move_to_end(key)
+
+            if entry.blocked_until <= now:
+                while entry.failures and entry.failures[0] <= now - self.window:
+                    entry.failures.popleft()
+
+                if len(entry.failures) >= self.max_attempts:
+                    if now - entry.blocked_until > self.max_delay:
+                        entry.strikes = 0
+                    entry.strikes += 1
+                    delay = min(self.base_delay * 2 ** (entry.strikes - 1), self.max_delay)
+                    entry.blocked_until = now + delay
+                    entry.failures.clear()
+
+            if entry.blocked_until > now:
+                self.blocked += 1
+                return entry.blocked_until - now
+
+            self.allowed += 1
+            self.failed += 1
+            entry.failures.append(now)
+            return 0.0
+
+    def succeeded(self, key: str):
+        """Удачная попытка не считается неудачей ключа"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.failures:
+                entry.failures.pop()
+                self.failed -= 1
+
+    def reset(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "keys": len(self._entries),
+                "blocked_keys": sum(1 for entry in self._entries.values() if entry.blocked_until > now),
+                "allowed": self.allowed,
+                "blocked": self.blocked,
+                "failed": self.failed,
+            }
@@ -0,0 +1,161 @@
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import models
+
+# Статус заявки -> колонка счётчика в user_stats
+STATUS_COLUMNS = {
+    "pending": models.UserStats.pending_applications,
+    "approved": models.UserStats.approved_applications,
+    "rejected": models.UserStats.rejected_applications,
+}
+
+
+def count_user_stats(db: Session, user_id: int) -> models.UserStats:
+    """Счётчики по таблицам applications, rooms и sensors, без записи в user_stats"""
+    counts = dict(
+        db.query(models.Application.status, func.count(models.Application.id))
+        .filter(models.Application.user_id == user_id)
+        .group_by(models.Application.status)
+        .all()
+    )
+
+    total_rooms = db.query(func.count(models.Room.id)).filter(
+        models.Room.user_id == user_id
+    ).scalar() or 0
+    total_sensors = db.query(func.count(models.Sensor.id)).join(models.Room).filter(
+        models.Room.user_id == user_id
+    ).scalar() or 0
+
+    return models.UserStats(
+        user_id=user_id,
+        pending_applications=counts.get("pending", 0),
+        approved_applications=counts.get("approved", 0),
+        rejected_applications=counts.get("rejected", 0),
+        total_rooms=total_rooms,
+        total_sensors=total_sensors,
+    )
+
+
+def stats_columns(user_id) -> list:
+    """
+    Колонки счётчиков для запроса с outerjoin user_stats: если строки
+    user_stats нет, значения считаются по таблицам, как в count_user_stats
+    """
+    def applications(status: str):
+        return select(func.count(models.Application.id)).where(
+            models.Application.user_id == user_id,
+            models.Application.status == status
+        ).scalar_subquery()
+
+    rooms = select(func.count(models.Room.id)).where(
+        models.Room.user_id == user_id
+    ).scalar_subquery()
+    sensors = select(func.count(models.Sensor.id)).join(
+        models.Room, models.Room.id == models.Sensor.room_id
+    ).where(models.Room.user_id == user_id).scalar_subquery()
+
+    counted = {
+        models.UserStats.pending_applications: applications("pending"),
+        models.UserStats.approved_applications: applications("approved"),
+        models.UserStats.rejected_applications: applications("rejected"),
+        models.UserStats.total_rooms: rooms,
+        models.UserStats.total_sensors: sensors,
+    }
+    return [func.coalesce(column, value).label(column.key) for column, value in counted.items()]
+
+
+def recount_user_stats(db: Session, user_id: int) -> models.UserStats:
+    """Пересчитать счётчики и сохранить их в транзакции вызывающего кода"""
+    counted = count_user_stats(db, user_id)
+
+    stats = db.get(models.UserStats, user_id)
+    if stats is None:
+        stats = models.UserStats(user_id=user_id)
+        db.add(stats)
+
+    for column in STATUS_COLUMNS.values():
+        setattr(stats, column.key, getattr(counted, column.key))
+    stats.total_rooms = counted.total_rooms
+    stats.total_sensors = counted.total_sensors
+    db.flush()
+    return stats
+
+
+def total_applications(stats: models.UserStats) -> int:
+    return stats.pending_applications + stats.approved_applications + stats.rejected_applications
+
+
+def stats_to_dict(stats: models.UserStats) -> dict:
+    """Счётчики в формате ProfileStatsResponse"""
+    return {
+        "total_applications": total_applications(stats),
+        "pending_applications": stats.pending_applications,
+        "approved_applications": stats.approved_applications,
+        "rejected_applications": stats.rejected_applications,
+        "total_rooms": stats.total_rooms,
+        "total_sensors": stats.total_sensors,
+    }
+
+
+def get_user_stats(db: Session, user_id: int) -> models.UserStats:
+    """
+    Счётчики пользователя одним запросом по первичному ключу.
+    Вызывается и на путях чтения (в т.ч. с реплики), поэтому при
+    отсутствии строки счётчики считаются по таблицам без вставки:
+    строку создаст первое изменение заявок или backfill_user_stats.
+    """
+    stats = db.get(models.UserStats, user_id)
+    if stats is None:
+        stats = count_user_stats(db, user_id)
+    return stats
+
+
+def change_application_status(
+        db: Session,
+        user_id: int,
+        old_status: Optional[str],
+        new_status: Optional[str]
+):
+    """
+    Сдвигает счётчики при создании заявки (old_status=None) или смене её
+    статуса. Выполняется атомарным UPDATE в транзакции вызывающего кода.
+    """
+    if old_status == new_status:
+        return
+
+    values = {}
+    if old_status in STATUS_COLUMNS:
+        column = STATUS_COLUMNS[old_status]
+        values[column.key] = column - 1
+    if new_status in STATUS_COLUMNS:
+        column = STATUS_COLUMNS[new_status]
+        values[column.key] = column + 1
+
+    if not values:
+        return
+
+    updated = db.query(models.UserStats).filter(
+        models.UserStats.user_id == user_id
+    ).update(values, synchronize_session="fetch")
+
+    if not updated:
+        # Строки ещё нет: пересчитываем с учётом изменений этой транзакции
+        db.flush()
+        recount_user_stats(db, user_id)
+
+
+def add_user_rooms(db: Session, user_id: int, rooms: int, sensors: int):
+    """Учитывает комнаты и датчики, созданные при одобрении заявки"""
+    updated = db.query(models.UserStats).filter(
+        models.UserStats.user_id == user_id
+    ).update({
+        models.UserStats.total_rooms: models.UserStats.total_rooms + rooms,
+        models.UserStats.total_sensors: models.UserStats.total_sensors + sensors,
+    }, synchronize_session="fetch")
+
+    if not updated:
+        db.flush()
+        recount_user_stats(db, user_id)
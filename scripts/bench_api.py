@@ -0,0 +1,327 @@
+"""
+Сквозной бенчмарк API на заполненной базе.
+
+Заполняет базу (scripts/init_db.py + пользователи, заявки, комнаты и
+датчики), прогоняет запросы ко всем роутерам через ASGI-приложение в
+этом же процессе и пишет JSON-отчёт: перцентили задержки, число
+SQL-запросов и объём выделенной памяти на вызов. Отчёты разных коммитов
+можно сравнить через --compare.
+
+Запуск:
+  python scripts/bench_api.py [--users 200] [--rooms 3] [--calls 50] [--output bench_api.json]
+  python scripts/bench_api.py --compare base.json [--output new.json]
+
+По умолчанию база - временный SQLite-файл; для PostgreSQL задайте --database-url.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+BENCH_PASSWORD = "bench-password"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--approved", type=float, default=0.8, help="доля одобренных заявок")
+    parser.add_argument("--rooms", type=int, default=3, help="комнат в заявке")
+    parser.add_argument("--sensors", type=int, default=5, help="датчиков в комнате (1-5)")
+    parser.add_argument("--calls", type=int, default=50, help="вызовов на эндпоинт")
+    parser.add_argument("--alloc-calls", type=int, default=5, help="вызовов с tracemalloc на эндпоинт")
+    parser.add_argument("--only", default=None, help="только эндпоинты, в имени которых есть подстрока")
+    parser.add_argument("--output", default="bench_api.json")
+    parser.add_argument("--compare", default=None, help="отчёт для сравнения")
+    parser.add_argument("--threshold", type=float, default=10.0, help="порог регрессии, %%")
+    return parser.parse_args()
+
+
+def setup_environment(args):
+    """Окружение задаётся до импорта app: движки создаются при импорте"""
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        path = os.path.join(tempfile.gettempdir(), "bench_api.db")
+        if os.path.exists(path):
+            os.remove(path)
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    # Хэши считаются в потоках: пул процессов не должен входить в замер
+    os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+    # Бенчмарк ходит с одного адреса, вход не должен упираться в ограничение
+    os.environ.setdefault("LOGIN_THROTTLE_PER_IP", "1000000")
+
+
+# ---------- Заполнение базы ----------
+def seed(args) -> dict:
+    from scripts.init_db import init_database
+    from app import models
+    from app.auth import get_password_hash
+    from app.database import SessionLocal
+    from app.utils.approvals import set_application_status
+    from app.utils.user_stats import change_application_status
+
+    init_database()
+
+    hashed_password = get_password_hash(BENCH_PASSWORD)
+    room_types = list(models.ROOM_TYPES.values())
+    sensor_ids = list(models.SENSOR_KINDS)[:max(1, min(args.sensors, len(models.SENSOR_KINDS)))]
+    approved_count = int(args.users * args.approved)
+
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        for i in range(args.users):
+            user = models.User(login=f"bench{i}", hashed_password=hashed_password, application_submitted=False)
+            db.add(user)
+            db.flush()
+
+            application = models.Application(
+                user_id=user.id,
+                rooms_config=[
+                    {"room_type": room_types[(i + r) % len(room_types)], "sensor_ids": sensor_ids}
+                    for r in range(args.rooms)
+                ],
+                status="pending"
+            )
+            db.add(application)
+            change_application_status(db, user.id, None, "pending")
+
+            if i < approved_count:
+                db.flush()
+                set_application_status(db, application, "approved")
+
+            if i % 100 == 99:
+                db.commit()
+        db.commit()
+
+        # Данные для запросов: первый пользователь с одобренной заявкой
+        user = db.query(models.User).filter(models.User.login == "bench0").first()
+        room = db.query(models.Room).filter(models.Room.user_id == user.id).order_by(models.Room.id).first()
+        sensors = {sensor.type: sensor.id for sensor in room.sensors} if room else {}
+        application_id = db.query(models.Application.id).filter(
+            models.Application.user_id == user.id
+        ).scalar()
+
+    print(f"seeded {args.users} users ({approved_count} approved) in {time.perf_counter() - start:.1f}s")
+    return {
+        "login": "bench0",
+        "room_id": room.id if room else 0,
+        "sensors": sensors,
+        "application_id": application_id,
+    }
+
+
+# ---------- Сценарии ----------
+def scenarios(data: dict) -> list:
+    """(имя, метод, путь, роль, тело); роль - user или admin"""
+    room_id = data["room_id"]
+    sensors = data["sensors"]
+    arduino_payload = {
+        "room_id": room_id,
+        "sensors": [
+            {"sensor_db_id": sensors.get("temperature", 0), "type": "temperature", "value": 22.5},
+            {"sensor_db_id": sensors.get("humidity", 0), "type": "humidity", "humidity_level": 40.0},
+            {"sensor_db_id": sensors.get("light", 0), "type": "light", "is_on": True},
+        ],
+    }
+    temperatures = [{"side": side, "value": 1.5} for side in ("north", "south", "west", "east")]
+
+    return [
+        ("auth.login", "POST", "/auth/login", None, {"login": data["login"], "password": BENCH_PASSWORD}),
+        ("auth.me", "GET", "/auth/me", "user", None),
+        ("auth.profile", "GET", "/auth/profile", "user", None),
+        ("applications.dictionaries", "GET", "/applications/dictionaries", None, None),
+        ("applications.my", "GET", "/applications/my", "user", None),
+        ("applications.get", "GET", f"/applications/{data['application_id']}", "user", None),
+        ("applications.admin_all", "GET", "/applications/admin/all", "admin", None),
+        ("applications.admin_pending", "GET", "/applications/admin/pending", "admin", None),
+        ("applications.admin_export", "GET", "/applications/admin/export", "admin", None),
+        ("users.admin_list", "GET", "/users/admin/list", "admin", None),
+        ("users.admin_export", "GET", "/users/admin/export", "admin", None),
+        ("rooms.list", "GET", "/rooms/", "user", None),
+        ("rooms.get", "GET", f"/rooms/{room_id}", "user", None),
+        ("rooms.stats", "GET", "/rooms/stats", "user", None),
+        ("rooms.user_rooms", "GET", "/rooms/user/rooms", "user", None),
+        ("rooms.devices", "GET", f"/rooms/{room_id}/devices", "user", None),
+        ("sensors.room", "GET", f"/sensors/room/{room_id}", "user", None),
+        ("sensors.get", "GET", f"/sensors/temperature/{sensors.get('temperature', 0)}", "user", None),
+        ("arduino.send_data", "POST", "/arduino/send-data", None, arduino_payload),
+        ("home_control.mode", "GET", "/home-control/mode", "user", None),
+        ("home_control.toggle", "PATCH", "/home-control/toggle-device",
+         "user", {"room_id": room_id, "sensor_id": sensors.get("light", 0), "type": "light", "is_on": False}),
+        ("outdoor_temperature.post", "POST", "/outdoor-temperature/", "user", {"temperatures": temperatures}),
+        ("outdoor_temperature.latest", "GET", "/outdoor-temperature/latest", "user", None),
+        ("outdoor_light.post", "POST", "/outdoor-light/", "user", {"is_on": True}),
+        ("outdoor_light.latest", "GET", "/outdoor-light/latest", "user", None),
+        ("dashboard", "GET", "/dashboard", "user", None),
+        ("internal.pool", "GET", "/internal/pool", "admin", None),
+        ("metrics", "GET", "/metrics", None, None),
+    ]
+
+
+# ---------- Замеры ----------
+def percentile(values: list, q: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def run_scenario(client, headers, method, path, body, calls, alloc_calls) -> dict:
+    from app.utils.query_stats import QueryBudget
+
+    def call():
+        response = client.request(method, path, headers=headers, json=body)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path}: {response.status_code} {response.text[:200]}")
+        return response
+
+    call()  # прогрев: кэши и ленивые загрузки не входят в замер
+
+    durations = []
+    with QueryBudget(max_queries=10 ** 9, max_repeats=None) as budget:
+        for _ in range(calls):
+            start = time.perf_counter()
+            call()
+            durations.append(time.perf_counter() - start)
+
+    # Память отдельным проходом: tracemalloc сильно замедляет вызовы
+    allocated = []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_calls):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            call()
+            _, peak = tracemalloc.get_traced_memory()
+            allocated.append(peak - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "calls": calls,
+        "p50_ms": round(percentile(durations, 50) * 1000, 3),
+        "p95_ms": round(percentile(durations, 95) * 1000, 3),
+        "p99_ms": round(percentile(durations, 99) * 1000, 3),
+        "mean_ms": round(sum(durations) / len(durations) * 1000, 3),
+        "queries_per_call": round(budget.stats.count / calls, 2),
+        "peak_alloc_kib_per_call": round(sum(allocated) / max(len(allocated), 1) / 1024, 1),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args) -> dict:
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    data = seed(args)
+
+    results = {}
+    with TestClient(app) as client:
+        tokens = {}
+        for role, login, password in (("user", data["login"], BENCH_PASSWORD), ("admin", "admin", "admin")):
+            response = client.post("/auth/login", json={"login": login, "password": password})
+            response.raise_for_status()
+            tokens[role] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        for name, method, path, role, body in scenarios(data):
+            if args.only and args.only not in name:
+                continue
+            # Вход считает Argon2 - хватает нескольких вызовов
+            calls = min(args.calls, 5) if name == "auth.login" else args.calls
+            results[name] = run_scenario(
+                client, tokens.get(role, {}), method, path, body, calls, args.alloc_calls
+            )
+            result = results[name]
+            print(
+                f"  {name:32} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+                f"p99 {result['p99_ms']:8.2f} ms  {result['queries_per_call']:6.2f} q/call  "
+                f"{result['peak_alloc_kib_per_call']:8.1f} KiB"
+            )
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "database": os.environ["DATABASE_URL"].split("://")[0],
+            "dataset": {
+                "users": args.users,
+                "approved": args.approved,
+                "rooms": args.rooms,
+                "sensors": args.sensors,
+            },
+        },
+        "endpoints": results,
+    }
+
+
+# ---------- Сравнение отчётов ----------
+COMPARED_FIELDS = ("p50_ms", "p95_ms", "queries_per_call", "peak_alloc_kib_per_call")
+
+
+def compare(base: dict, new: dict, threshold: float) -> int:
+    """Печатает изменения по эндпоинтам, возвращает число регрессий"""
+    print(f"\ncompare {base['meta']['commit']} -> {new['meta']['commit']} (threshold {threshold:.0f}%)")
+    if base["meta"]["dataset"] != new["meta"]["dataset"]:
+        print("  warning: datasets differ, numbers are not directly comparable")
+
+    regressions = 0
+    for name, result in new["endpoints"].items():
+        old = base["endpoints"].get(name)
+        if old is None:
+            print(f"  {name:32} new")
+            continue
+
+        changes = []
+        for field in COMPARED_FIELDS:
+            before, after = old[field], result[field]
+            delta = (after - before) / before * 100 if before else (0.0 if after == before else 100.0)
+            mark = ""
+            # Число запросов сравнивается строго: любой рост - регрессия
+            if (field == "queries_per_call" and after > before) or (field != "queries_per_call" and delta > threshold):
+                mark = " !"
+                regressions += 1
+            changes.append(f"{field} {before}->{after} ({delta:+.0f}%){mark}")
+        print(f"  {name:32} " + ", ".join(changes))
+
+    print(f"regressions: {regressions}")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    setup_environment(args)
+
+    report = run(args)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"report: {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)
+        if compare(base, report, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Пропускная способность хэширования паролей с текущими параметрами Argon2
+(ARGON2_TIME_COST, ARGON2_MEMORY_COST, ARGON2_PARALLELISM): в одном
+процессе и через пул процессов app.passwords.
+
+Запуск: python scripts/bench_passwords.py [--hashes 40] [--workers 4]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hashes", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    # Размер пула читается при импорте модуля
+    os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    from app import passwords
+
+    print(
+        f"argon2: time_cost={passwords.ARGON2_TIME_COST}, "
+        f"memory_cost={passwords.ARGON2_MEMORY_COST} KiB, "
+        f"parallelism={passwords.ARGON2_PARALLELISM}"
+    )
+
+    stored = passwords.hash_password("benchmark-password")
+
+    start = time.perf_counter()
+    for _ in range(args.hashes):
+        passwords.verify_password("benchmark-password", stored)
+    single = args.hashes / (time.perf_counter() - start)
+    print(f"  single process: {single:8.1f} verifies/s ({1000 / single:.1f} ms each)")
+
+    async def run_pool():
+        # Прогрев: запуск процессов не входит в замер
+        await asyncio.gather(*(
+            passwords.verify_password_async("benchmark-password", stored)
+            for _ in range(args.workers)
+        ))
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            passwords.verify_password_async("benchmark-password", stored)
+            for _ in range(args.hashes)
+        ))
+        return args.hashes / (time.perf_counter() - start)
+
+    pooled = asyncio.run(run_pool())
+    passwords.shutdown_pool()
+    cores = max(min(args.workers, os.cpu_count() or 1), 1)
+    print(
+        f"  pool of {args.workers}: {pooled:8.1f} verifies/s, "
+        f"{pooled / cores:.1f} per core ({cores} cores used)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Сравнение сериализации больших списков заявок:
+обычный путь FastAPI (валидация по response_model -> python -> json.dumps)
+против fast_json_response (dict -> JSON bytes в pydantic-core).
+
+Запуск: python scripts/bench_serialization.py [--rows 5000] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter
+
+from app import schemas
+from app.utils.serialization import fast_json_response
+
+
+def make_rows(count: int) -> List[dict]:
+    now = datetime.utcnow()
+    return [
+        {
+            "id": i,
+            "user_id": i % 997,
+            "rooms_config": [
+                {"room_type": "Кухня", "sensor_ids": [1, 2, 3, 4, 5]},
+                {"room_type": "Спальня", "sensor_ids": [1, 2]},
+                {"room_type": "Санузел", "sensor_ids": [4, 5]},
+            ],
+            "status": "pending",
+            "rejection_comment": None,
+            "created_at": now - timedelta(minutes=i),
+            "updated_at": now,
+            "user_login": f"user{i % 997}",
+        }
+        for i in range(count)
+    ]
+
+
+def current_path(rows: List[dict], adapter: TypeAdapter) -> bytes:
+    """То, что делает FastAPI для response_model=list[ApplicationResponse]"""
+    validated = adapter.validate_python(rows)
+    content = adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(rows: List[dict]) -> bytes:
+    return fast_json_response(rows).body
+
+
+def measure(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    adapter = TypeAdapter(List[schemas.ApplicationResponse])
+
+    # Оба пути должны давать одинаковый JSON
+    assert json.loads(current_path(rows, adapter)) == json.loads(fast_path(rows))
+
+    current = measure(lambda: current_path(rows, adapter), args.repeat)
+    fast = measure(lambda: fast_path(rows), args.repeat)
+
+    print(f"rows: {args.rows}, best of {args.repeat}")
+    print(f"  response_model path: {current * 1000:8.2f} ms  ({args.rows / current:,.0f} rows/s)")
+    print(f"  fast_json_response:  {fast * 1000:8.2f} ms  ({args.rows / fast:,.0f} rows/s)")
+    print(f"  speedup: x{current / fast:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Пропускная способность приёма данных от Arduino на SQLite.
+
+Создаёт базу в файле (комнаты с датчиками одного пользователя), затем:
+1. db  - одиночные UPDATE значения датчика с commit после каждого:
+   задержка самой БД без HTTP;
+2. api - POST /arduino/send-data через ASGI-приложение в этом же
+   процессе при разном числе одновременных запросов.
+
+Запуск:
+  python scripts/bench_sqlite_ingest.py [--rooms 50] [--requests 2000] [--concurrency 1,8,32]
+  python scripts/bench_sqlite_ingest.py --untuned   # без WAL и pragmas, для сравнения
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from scripts.bench_api import BENCH_PASSWORD, git_commit, percentile
+
+# Настройки SQLite по умолчанию (rollback journal, полный fsync)
+UNTUNED_PRAGMAS = {
+    "SQLITE_JOURNAL_MODE": "DELETE",
+    "SQLITE_SYNCHRONOUS": "FULL",
+    "SQLITE_MMAP_SIZE": "0",
+    "SQLITE_CACHE_SIZE": "-2000",
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=os.path.join(tempfile.gettempdir(), "bench_ingest.db"))
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--db-updates", type=int, default=2000, help="одиночных UPDATE в замере db")
+    parser.add_argument("--requests", type=int, default=2000, help="запросов send-data на уровень параллельности")
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--untuned", action="store_true", help="без WAL и pragmas")
+    parser.add_argument("--output", default="bench_sqlite_ingest.json")
+    return parser.parse_args()
+
+
+def setup_environment(args):
+    """Окружение задаётся до импорта app: движки создаются при импорте"""
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(args.path + suffix):
+            os.remove(args.path + suffix)
+    os.environ["DATABASE_URL"] = f"sqlite:///{args.path}"
+    os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+    if args.untuned:
+        os.environ.update(UNTUNED_PRAGMAS)
+
+
+def seed(args) -> list:
+    """Пользователь edge с комнатами по 5 датчиков; возвращает тела запросов send-data"""
+    from scripts.init_db import init_database
+    from app import models
+    from app.auth import get_password_hash
+    from app.database import SessionLocal
+    from app.utils.user_stats import add_user_rooms
+
+    init_database()
+
+    kinds = list(models.SENSOR_KINDS.values())
+    with SessionLocal() as db:
+        user = models.User(login="edge", hashed_password=get_password_hash(BENCH_PASSWORD))
+        db.add(user)
+        db.flush()
+        rooms = [models.Room(user_id=user.id, name=f"Комната {i}", room_type="Кухня") for i in range(args.rooms)]
+        db.add_all(rooms)
+        db.flush()
+        for room in rooms:
+            room.sensors = [models.Sensor(room_id=room.id, type=kind) for kind in kinds]
+        db.flush()
+        add_user_rooms(db, user.id, len(rooms), len(rooms) * len(kinds))
+        db.commit()
+
+        return [
+            {
+                "room_id": room.id,
+                "sensors": [
+                    {"sensor_db_id": sensor.id, "type": sensor.type, **sensor_values(sensor.type)}
+                    for sensor in room.sensors
+                ],
+            }
+            for room in rooms
+        ]
+
+
+def sensor_values(kind: str) -> dict:
+    if kind == "temperature":
+        return {"value": round(random.uniform(18, 26), 1)}
+    if kind == "humidity":
+        return {"humidity_level": round(random.uniform(30, 70), 1)}
+    if kind == "gas":
+        return {"value": False}
+    return {"is_on": random.random() < 0.5}
+
+
+def summary(durations: list, elapsed: float, rows_per_call: int = 1) -> dict:
+    return {
+        "calls": len(durations),
+        "calls_per_s": round(len(durations) / elapsed, 1),
+        "rows_per_s": round(len(durations) * rows_per_call / elapsed, 1),
+        "p50_ms": round(percentile(durations, 50) * 1000, 3),
+        "p95_ms": round(percentile(durations, 95) * 1000, 3),
+        "p99_ms": round(percentile(durations, 99) * 1000, 3),
+    }
+
+
+def bench_db(args, payloads: list) -> dict:
+    """UPDATE одного датчика + commit, без HTTP и ORM"""
+    from sqlalchemy import update
+    from app import models
+    from app.database import engine
+
+    sensor_ids = [sensor["sensor_db_id"] for payload in payloads for sensor in payload["sensors"]]
+
+    durations = []
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        for i in range(args.db_updates):
+            began = time.perf_counter()
+            conn.execute(
+                update(models.Sensor).where(models.Sensor.id == sensor_ids[i % len(sensor_ids)]),
+                {"value": float(i)}
+            )
+            conn.commit()
+            durations.append(time.perf_counter() - began)
+    return summary(durations, time.perf_counter() - start)
+
+
+async def bench_api(args, payloads: list, concurrency: int) -> dict:
+    import httpx
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.post("/auth/login", json={"login": "edge", "password": BENCH_PASSWORD})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        # Прогрев: кэш пользователя и комнаты в памяти
+        for payload in payloads:
+            (await client.post("/arduino/send-data", json=payload, headers=headers)).raise_for_status()
+
+        durations = []
+        queue = asyncio.Queue()
+        for i in range(args.requests):
+            queue.put_nowait(payloads[i % len(payloads)])
+
+        async def worker():
+            while not queue.empty():
+                payload = queue.get_nowait()
+                began = time.perf_counter()
+                response = await client.post("/arduino/send-data", json=payload, headers=headers)
+                durations.append(time.perf_counter() - began)
+                if response.status_code != 200 or not response.json()["success"]:
+                    raise RuntimeError(f"send-data: {response.status_code} {response.text[:200]}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return summary(durations, elapsed, rows_per_call=len(payloads[0]["sensors"]))
+
+
+async def run_api(args, payloads: list) -> dict:
+    from app.main import app
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        for concurrency in [int(value) for value in args.concurrency.split(",")]:
+            results[f"c{concurrency}"] = result = await bench_api(args, payloads, concurrency)
+            print(
+                f"  api c={concurrency:<4} {result['calls_per_s']:8.1f} req/s  {result['rows_per_s']:9.1f} rows/s  "
+                f"p50 {result['p50_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms"
+            )
+    return results
+
+
+def main():
+    args = parse_args()
+    setup_environment(args)
+
+    payloads = seed(args)
+    mode = "untuned" if args.untuned else "tuned"
+    print(f"sqlite ({mode}), {args.rooms} rooms x {len(payloads[0]['sensors'])} sensors")
+
+    db_result = bench_db(args, payloads)
+    print(
+        f"  db  update+commit   {db_result['calls_per_s']:8.1f} tx/s  "
+        f"p50 {db_result['p50_ms']:7.3f} ms  p99 {db_result['p99_ms']:7.3f} ms"
+    )
+    api_results = asyncio.run(run_api(args, payloads))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "mode": mode,
+            "rooms": args.rooms,
+        },
+        "db": db_result,
+        "api": api_results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"report: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
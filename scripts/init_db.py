@@ -6,9 +6,10 @@ import random
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from sqlalchemy import create_engine
-from app.models import Base
 from app.auth import get_password_hash
 from app.models import User
+from app.migrations import ensure_schema
+from app.utils.startup import wait_for_database
 
 # ---------- Генерация случайных строк ----------
 def generate_random_string(length=3):
@@ -28,8 +29,12 @@ def init_database():
     # Используем URL из docker-compose
     engine = create_engine(DATABASE_URL)
 
-    # Создаем таблицы
-    Base.metadata.create_all(bind=engine)
+    # Ждем, пока база начнет принимать соединения
+    wait_for_database(engine)
+
+    # Создаем таблицы и переносим данные, если версия схемы устарела
+    if not ensure_schema(engine):
+        print("Schema is up to date")
 
     # Создаем сессию
     from sqlalchemy.orm import sessionmaker
@@ -1,11 +1,20 @@
 #!/bin/bash
+set -e
 
-# Ждем пока база данных будет готова
-echo "Waiting for database to be ready..."
-sleep 10
-
-# Инициализируем базу данных
+# Ждем базу данных (с backoff) и обновляем схему, если ее версия устарела
 python scripts/init_db.py
 
-# Запускаем приложение
-uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
\ No newline at end of file
+# Запускаем приложение без --reload, по умолчанию один воркер.
+# При WEB_CONCURRENCY > 1 учтите, что состояние в памяти у каждого
+# воркера своё:
+# - ограничение попыток входа (LOGIN_THROTTLE_*) считается отдельно в
+#   каждом воркере, фактический лимит умножается на число воркеров;
+# - /metrics отдаёт счётчики того воркера, который ответил на запрос.
+# На SQLite всегда один воркер: у файла один писатель, а кэши процессов
+# синхронизируются только через Postgres (app/utils/invalidation.py).
+# Для разработки: uvicorn app.main:app --reload
+WORKERS="${WEB_CONCURRENCY:-1}"
+case "$DATABASE_URL" in
+    sqlite*) WORKERS=1 ;;
+esac
+exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers "$WORKERS"
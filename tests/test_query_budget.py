@@ -0,0 +1,129 @@
+"""
+Бюджеты SQL-запросов горячих эндпоинтов (app/utils/query_stats.py).
+
+База - временный файл SQLite, данные как в scripts/bench_api.py:
+несколько пользователей с одобренными заявками (комнаты и датчики).
+Бюджет проверяется на повторном запросе, когда кэши пользователя и
+токена уже прогреты, и не должен расти с числом комнат и пользователей.
+
+Запуск: python -m pytest -q tests/test_query_budget.py
+"""
+import os
+import tempfile
+
+# Окружение задаётся до импорта app: движки создаются при импорте
+_db_dir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir.name, 'query_budget.db')}"
+os.environ.pop("DATABASE_READ_URL", None)
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["LOGIN_THROTTLE_PER_IP"] = "1000000"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import models
+from app.auth import get_password_hash
+from app.database import SessionLocal
+from app.main import app
+from app.utils.approvals import set_application_status
+from app.utils.query_stats import QueryBudget
+from app.utils.user_stats import change_application_status
+from scripts.init_db import ADMIN_LOGIN, ADMIN_PASSWORD, init_database
+
+PASSWORD = "budget-password"
+USERS = 5
+ROOMS = 4
+
+
+def seed() -> dict:
+    init_database()
+
+    hashed_password = get_password_hash(PASSWORD)
+    room_types = list(models.ROOM_TYPES.values())
+    sensor_ids = list(models.SENSOR_KINDS)
+
+    with SessionLocal() as db:
+        for i in range(USERS):
+            user = models.User(login=f"budget{i}", hashed_password=hashed_password, application_submitted=False)
+            db.add(user)
+            db.flush()
+
+            application = models.Application(
+                user_id=user.id,
+                rooms_config=[
+                    {"room_type": room_types[r % len(room_types)], "sensor_ids": sensor_ids}
+                    for r in range(ROOMS)
+                ],
+                status="pending"
+            )
+            db.add(application)
+            change_application_status(db, user.id, None, "pending")
+            db.flush()
+            set_application_status(db, application, "approved")
+        db.commit()
+
+        user = db.query(models.User).filter(models.User.login == "budget0").first()
+        room = db.query(models.Room).filter(models.Room.user_id == user.id).order_by(models.Room.id).first()
+        return {"room_id": room.id, "sensors": {sensor.type: sensor.id for sensor in room.sensors}}
+
+
+@pytest.fixture(scope="module")
+def client():
+    data = seed()
+    with TestClient(app) as client:
+        client.data = data
+        yield client
+    _db_dir.cleanup()
+
+
+def _headers(client: TestClient, login: str, password: str) -> dict:
+    response = client.post("/auth/login", json={"login": login, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture(scope="module")
+def user_headers(client):
+    return _headers(client, "budget0", PASSWORD)
+
+
+@pytest.fixture(scope="module")
+def admin_headers(client):
+    return _headers(client, ADMIN_LOGIN, ADMIN_PASSWORD)
+
+
+def _assert_budget(client: TestClient, max_queries: int, method: str, path: str, **kwargs):
+    # Первый запрос прогревает кэши пользователя и токена
+    assert client.request(method, path, **kwargs).status_code == 200
+
+    with QueryBudget(max_queries=max_queries) as budget:
+        response = client.request(method, path, **kwargs)
+    assert response.status_code == 200, response.text
+    return budget
+
+
+def test_get_rooms(client, user_headers):
+    _assert_budget(client, 2, "GET", "/rooms/", headers=user_headers)
+
+
+def test_get_user_rooms(client, user_headers):
+    _assert_budget(client, 2, "GET", "/rooms/user/rooms", headers=user_headers)
+
+
+def test_get_all_users(client, admin_headers):
+    _assert_budget(client, 1, "GET", "/users/admin/list", headers=admin_headers)
+
+
+def test_receive_arduino_data(client):
+    room_id = client.data["room_id"]
+    sensors = client.data["sensors"]
+    payload = {
+        "room_id": room_id,
+        "sensors": [
+            {"sensor_db_id": sensors["temperature"], "type": "temperature", "value": 22.5},
+            {"sensor_db_id": sensors["humidity"], "type": "humidity", "humidity_level": 40.0},
+            {"sensor_db_id": sensors["light"], "type": "light", "is_on": True},
+        ],
+    }
+    # Комната и по одному UPDATE на набор изменённых столбцов, не на датчик
+    _assert_budget(client, 3, "POST", "/arduino/send-data", json=payload)
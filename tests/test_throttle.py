@@ -0,0 +1,67 @@
+"""Ограничение попыток входа (app/utils/throttle.py)"""
+import pytest
+
+from app.utils import throttle
+from app.utils.throttle import SlidingWindowThrottle
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(throttle.time, "monotonic", clock)
+    return clock
+
+
+def _block(limiter: SlidingWindowThrottle, key: str) -> float:
+    """Неудачные попытки до блокировки; возвращает её длительность"""
+    for _ in range(limiter.max_attempts):
+        assert limiter.attempt(key) == 0
+    return limiter.attempt(key)
+
+
+def test_blocks_after_max_attempts(clock):
+    limiter = SlidingWindowThrottle(max_attempts=3, window=60, base_delay=10, max_delay=100)
+
+    assert _block(limiter, "user") == 10
+    assert limiter.attempt("user") == 10
+
+    clock.now += 10
+    assert limiter.attempt("user") == 0
+
+
+def test_succeeded_releases_attempt(clock):
+    limiter = SlidingWindowThrottle(max_attempts=2, window=60, base_delay=10, max_delay=100)
+
+    for _ in range(5):
+        assert limiter.attempt("ip") == 0
+        limiter.succeeded("ip")
+
+
+def test_repeated_blocks_double(clock):
+    limiter = SlidingWindowThrottle(max_attempts=3, window=60, base_delay=10, max_delay=100)
+
+    assert _block(limiter, "user") == 10
+    clock.now += 10
+    assert _block(limiter, "user") == 20
+    clock.now += 20
+    assert _block(limiter, "user") == 40
+
+
+def test_strikes_reset_after_idle(clock):
+    limiter = SlidingWindowThrottle(max_attempts=3, window=60, base_delay=10, max_delay=100)
+
+    assert _block(limiter, "user") == 10
+    clock.now += 10
+    assert _block(limiter, "user") == 20
+
+    # После конца блокировки прошло больше max_delay - снова base_delay
+    clock.now += 20 + 101
+    assert _block(limiter, "user") == 10